@@ -57,9 +57,11 @@ def local_sentiment_analysis(text):
             return "Confused"
         return "Neutral"
     return base
+import asyncio
 import json
 import os
 import re
+import tracing
 from dotenv import load_dotenv
 from langchain.prompts import PromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -88,31 +90,65 @@ prompt = PromptTemplate(
     )
 )
 
-def classify_ticket(ticket_text: str) -> dict:
-    # Use LLM for topic and priority only
-    formatted = prompt.format(ticket_text=ticket_text)
-    response = llm.invoke(formatted)
+def _parse_classification(response) -> dict:
+    """Validate the LLM's topic/priority JSON, falling back to safe defaults."""
     if not response or not response.text:
         raise ValueError("LLM response is empty or invalid.")
-    raw_text = response.content.strip()
-    cleaned = re.sub(r"```json|```", "", raw_text, flags=re.IGNORECASE).strip()
-    try:
-        parsed = json.loads(cleaned)
-    except json.JSONDecodeError:
-        print(f"⚠️ Warning: Invalid JSON returned: {raw_text}")
-        parsed = {"topic": "Unknown", "priority": "P2"}
+    with tracing.span("classifier.parse"):
+        raw_text = response.content.strip()
+        cleaned = re.sub(r"```json|```", "", raw_text, flags=re.IGNORECASE).strip()
+        try:
+            parsed = json.loads(cleaned)
+        except json.JSONDecodeError:
+            print(f"⚠️ Warning: Invalid JSON returned: {raw_text}")
+            parsed = {"topic": "Unknown", "priority": "P2"}
 
     # Validate topic and priority
     if parsed.get("topic") not in ['How-to', 'Product', 'Connector', 'Lineage', 'API/SDK', 'SSO', 'Glossary', 'Best practices', 'Sensitive data']:
         parsed["topic"] = "Unknown"
     if parsed.get("priority") not in ['P0', 'P1', 'P2']:
         parsed["priority"] = "P2"
+    return parsed
+
+
+def classify_ticket(ticket_text: str) -> dict:
+    # Use LLM for topic and priority only
+    formatted = prompt.format(ticket_text=ticket_text)
+    with tracing.span("classifier.llm") as s:
+        response = llm.invoke(formatted)
+        s.record_llm(response)
+    parsed = _parse_classification(response)
 
     # Use local model for sentiment
-    sentiment = local_sentiment_analysis(ticket_text)
+    with tracing.span("classifier.sentiment"):
+        sentiment = local_sentiment_analysis(ticket_text)
     parsed["sentiment"] = sentiment
     return parsed
 
+
+async def aclassify_ticket(ticket_text: str) -> dict:
+    """
+    Async classify_ticket: the LLM call is awaited and the local sentiment
+    model runs in the event loop's default executor alongside it.
+    """
+    formatted = prompt.format(ticket_text=ticket_text)
+
+    async def _sentiment():
+        with tracing.span("classifier.sentiment"):
+            return await asyncio.to_thread(local_sentiment_analysis, ticket_text)
+
+    async def _llm():
+        with tracing.span("classifier.llm") as s:
+            response = await llm.ainvoke(formatted)
+            s.record_llm(response)
+        return response
+
+    response, sentiment = await asyncio.gather(_llm(), _sentiment())
+    parsed = _parse_classification(response)
+    parsed["sentiment"] = sentiment
+    return parsed
+
+
 if __name__ == "__main__":
     sample_ticket = " your system is charging me twice."
     result = classify_ticket(sample_ticket)
@@ -0,0 +1,91 @@
+# agent/duplicate_index.py
+"""
+Incrementally updated nearest-neighbour index over open ticket embeddings.
+
+Vectors are L2-normalised, so inner product is cosine similarity. Tickets are
+added as they are created and removed when they are closed or fall out of the
+time window, so searches only ever see recent open tickets. A flat index is
+used because that working set is small (a day of tickets) and, unlike graph
+indexes, it supports removal.
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+
+def normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class DuplicateIndex:
+    def __init__(self, window_seconds: Optional[float] = None):
+        self.window_seconds = window_seconds
+        # Created on the first add, once the embedding size is known
+        self._index = None
+        self._lock = threading.Lock()
+        self._next_row = 0
+        self._ticket_by_row: Dict[int, str] = {}
+        self._row_by_ticket: Dict[str, int] = {}
+        # (added_at, row), oldest first, for expiring old tickets
+        self._added = deque()
+
+    def __len__(self) -> int:
+        return len(self._row_by_ticket)
+
+    def add(self, ticket_id: str, vector: np.ndarray, added_at: float = None):
+        vector = normalize(vector)
+        added_at = added_at or time.time()
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+            self._expire(added_at)
+            row = self._next_row
+            self._next_row += 1
+            self._index.add_with_ids(vector, np.array([row], dtype=np.int64))
+            self._ticket_by_row[row] = ticket_id
+            self._row_by_ticket[ticket_id] = row
+            self._added.append((added_at, row))
+
+    def remove(self, ticket_id: str) -> bool:
+        with self._lock:
+            row = self._row_by_ticket.pop(ticket_id, None)
+            if row is None:
+                return False
+            del self._ticket_by_row[row]
+            self._index.remove_ids(np.array([row], dtype=np.int64))
+            return True
+
+    def search(self, vector: np.ndarray, k: int = 5, min_similarity: float = 0.0) -> List[Tuple[str, float]]:
+        """Up to k (ticket_id, cosine similarity) pairs at or above `min_similarity`, closest first."""
+        vector = normalize(vector)
+        with self._lock:
+            if self._index is None:
+                return []
+            self._expire(time.time())
+            if self._index.ntotal == 0:
+                return []
+            scores, rows = self._index.search(vector, min(k, self._index.ntotal))
+            return [
+                (self._ticket_by_row[row], float(score))
+                for score, row in zip(scores[0], rows[0])
+                if row != -1 and score >= min_similarity
+            ]
+
+    def _expire(self, now: float):
+        if not self.window_seconds:
+            return
+        expired = []
+        while self._added and now - self._added[0][0] > self.window_seconds:
+            _, row = self._added.popleft()
+            ticket_id = self._ticket_by_row.pop(row, None)
+            if ticket_id is not None:
+                del self._row_by_ticket[ticket_id]
+                expired.append(row)
+        if expired:
+            self._index.remove_ids(np.array(expired, dtype=np.int64))
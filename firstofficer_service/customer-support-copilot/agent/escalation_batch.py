@@ -0,0 +1,337 @@
+# agent/escalation_batch.py
+"""
+Columnar escalation factors and a NumPy batch scorer.
+
+`EscalationDecisionEngine.score` scores one ticket at a time. This module also
+stores the raw inputs of that score for every processed ticket and re-scores
+millions of them at once, so alternate thresholds and weights can be replayed
+over historical traffic.
+"""
+import atexit
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# --- Scoring rules shared with EscalationDecisionEngine.score ---
+COMPLEXITY_KEYWORDS = ["integrate", "custom", "setup", "troubleshoot"]
+LONG_QUERY_WORDS = 50
+
+SENTIMENT_URGENCY = {"Angry": 0.9, "Frustrated": 0.7}
+PRIORITY_URGENCY = {"P0": 0.8, "P1": 0.4}
+
+CRITICAL_TOPICS = {
+    "Sensitive data": 0.9,
+    "Security": 0.8,
+    "Billing": 0.7,
+    "Compliance": 0.8,
+    "Integration": 0.6,
+    "Custom": 0.7,
+}
+DEFAULT_TOPIC_CRITICALITY = 0.2
+
+ESCALATION_WEIGHTS = {
+    "complexity": 0.3,
+    "sentiment_urgency": 0.3,
+    "topic_criticality": 0.3,
+    "response_quality": 0.1,
+}
+
+CATEGORICAL_COLUMNS = ["topic", "sentiment", "priority"]
+NUMERIC_COLUMNS = ["has_question", "word_count", "has_complexity_keyword", "response_quality"]
+
+FACTOR_SCHEMA = pa.schema([
+    ("processed_at", pa.string()),
+    ("topic", pa.string()),
+    ("sentiment", pa.string()),
+    ("priority", pa.string()),
+    ("has_question", pa.bool_()),
+    ("word_count", pa.int32()),
+    ("has_complexity_keyword", pa.bool_()),
+    ("complexity", pa.float64()),
+    ("sentiment_urgency", pa.float64()),
+    ("topic_criticality", pa.float64()),
+    ("response_quality", pa.float64()),
+    ("escalation_score", pa.float64()),
+    ("should_escalate", pa.bool_()),
+])
+
+
+def extract_features(query: str, classification: Dict) -> Dict:
+    """Raw per-ticket inputs of the escalation score."""
+    query_lower = query.lower()
+    return {
+        "topic": classification.get("topic", "Unknown"),
+        "sentiment": classification.get("sentiment", "Neutral"),
+        "priority": classification.get("priority", "P2"),
+        "has_question": "?" in query,
+        "word_count": len(query.split()),
+        "has_complexity_keyword": any(word in query_lower for word in COMPLEXITY_KEYWORDS),
+    }
+
+
+class EscalationDecisionEngine:
+    def __init__(self, escalation_threshold: float = None):
+        if escalation_threshold is None:
+            escalation_threshold = float(os.getenv("ESCALATION_THRESHOLD", 0.6))
+        self.escalation_threshold = escalation_threshold
+
+    def score(self, query: str, classification: Dict, draft_answer: str = None) -> Dict:
+        """Return escalation decision + reasoning (no text response)."""
+        # Same rules as score_batch, one ticket at a time
+        features = extract_features(query, classification)
+
+        # --- Query complexity ---
+        complexity = 0.0
+        if features["has_question"]:
+            complexity += 0.3
+        if features["word_count"] > LONG_QUERY_WORDS:
+            complexity += 0.2
+        if features["has_complexity_keyword"]:
+            complexity += 0.2
+
+        # --- Sentiment/urgency ---
+        sentiment_urgency = (
+            SENTIMENT_URGENCY.get(features["sentiment"], 0.0)
+            + PRIORITY_URGENCY.get(features["priority"], 0.0)
+        )
+
+        # --- Topic criticality ---
+        topic_criticality = CRITICAL_TOPICS.get(features["topic"], DEFAULT_TOPIC_CRITICALITY)
+
+        # --- Response quality ---
+        response_quality = 0.0
+
+        # --- Weighted score ---
+        weights = ESCALATION_WEIGHTS
+        factors = {
+            "complexity": complexity,
+            "sentiment_urgency": sentiment_urgency,
+            "topic_criticality": topic_criticality,
+            "response_quality": response_quality,
+        }
+        escalation_score = sum(factors[k] * weights[k] for k in weights)
+        should_escalate = escalation_score > self.escalation_threshold
+
+        reasoning = []
+        if factors["complexity"] > 0.3:
+            reasoning.append("Complex query")
+        if factors["sentiment_urgency"] > 0.7:
+            reasoning.append("High urgency/sentiment")
+        if factors["topic_criticality"] > 0.7:
+            reasoning.append("Critical topic")
+        if factors["response_quality"] > 0.3:
+            reasoning.append("Low answer quality")
+
+        return {
+            "should_escalate": should_escalate,
+            "escalation_score": escalation_score,
+            "factors": factors,
+            "reasoning": reasoning,
+        }
+
+
+# --- Batch scoring ---
+def _lookup(column, mapping: Dict[str, float], default: float = 0.0) -> np.ndarray:
+    """Map a dictionary-encoded column (codes, categories) through `mapping`."""
+    codes, categories = column
+    table = np.array([mapping.get(c, default) for c in categories] or [default], dtype=np.float64)
+    return table[codes]
+
+
+def score_batch(factors: Dict, threshold: float = None, weights: Dict[str, float] = None,
+                critical_topics: Dict[str, float] = None) -> Dict[str, np.ndarray]:
+    """
+    Vectorized equivalent of EscalationDecisionEngine.score over columns
+    returned by `load_factors` (or `to_columns`).
+    """
+    if threshold is None:
+        threshold = float(os.getenv("ESCALATION_THRESHOLD", 0.6))
+    weights = {**ESCALATION_WEIGHTS, **(weights or {})}
+    critical_topics = CRITICAL_TOPICS if critical_topics is None else critical_topics
+
+    complexity = (
+        0.3 * factors["has_question"]
+        + 0.2 * (factors["word_count"] > LONG_QUERY_WORDS)
+        + 0.2 * factors["has_complexity_keyword"]
+    )
+    sentiment_urgency = (
+        _lookup(factors["sentiment"], SENTIMENT_URGENCY)
+        + _lookup(factors["priority"], PRIORITY_URGENCY)
+    )
+    topic_criticality = _lookup(factors["topic"], critical_topics, DEFAULT_TOPIC_CRITICALITY)
+    response_quality = factors["response_quality"]
+
+    escalation_score = (
+        complexity * weights["complexity"]
+        + sentiment_urgency * weights["sentiment_urgency"]
+        + topic_criticality * weights["topic_criticality"]
+        + response_quality * weights["response_quality"]
+    )
+    return {
+        "complexity": complexity,
+        "sentiment_urgency": sentiment_urgency,
+        "topic_criticality": topic_criticality,
+        "response_quality": response_quality,
+        "escalation_score": escalation_score,
+        "should_escalate": escalation_score > threshold,
+    }
+
+
+# --- Columnar storage ---
+def _encode(array: pa.ChunkedArray, fill: str):
+    encoded = pc.fill_null(array, fill).combine_chunks().dictionary_encode()
+    return encoded.indices.to_numpy(zero_copy_only=False), encoded.dictionary.to_pylist()
+
+
+def to_columns(table: pa.Table) -> Dict:
+    """Convert an Arrow table of factors into the arrays `score_batch` expects."""
+    columns = {}
+    for name, fill in zip(CATEGORICAL_COLUMNS, ["Unknown", "Neutral", "P2"]):
+        columns[name] = _encode(table.column(name), fill)
+    for name in NUMERIC_COLUMNS:
+        if name in table.column_names:
+            column = table.column(name)
+            values = pc.fill_null(column, pa.scalar(0).cast(column.type)).to_numpy()
+        else:
+            values = np.zeros(table.num_rows)
+        columns[name] = values.astype(np.float64) if name == "response_quality" else values
+    columns["num_rows"] = table.num_rows
+    return columns
+
+
+def detect_format(path: str) -> str:
+    """"arrow" when every data file under `path` is Arrow IPC (bulk_process.py --format arrow), else "parquet"."""
+    if os.path.isdir(path):
+        # Same files pyarrow.dataset reads: temp and checkpoint files start with "." or "_"
+        names = [name for _, _, files in os.walk(path) for name in files if not name.startswith((".", "_"))]
+    else:
+        names = [os.path.basename(path)]
+    if names and all(name.endswith((".arrow", ".feather")) for name in names):
+        return "arrow"
+    return "parquet"
+
+
+def load_factors(path: str, since: Optional[str] = None, until: Optional[str] = None,
+                 fmt: Optional[str] = None) -> Dict:
+    """
+    Read stored factors (this module's store or bulk_process.py output) from a
+    Parquet or Arrow directory, optionally limited to an ISO `processed_at` window.
+    `fmt` ("parquet" or "arrow") is detected from the file names when omitted.
+    """
+    fmt = fmt or detect_format(path)
+    dataset = ds.dataset(path, format="ipc" if fmt == "arrow" else "parquet")
+    wanted = [c for c in CATEGORICAL_COLUMNS + NUMERIC_COLUMNS + ["processed_at"]
+              if c in dataset.schema.names]
+    filter_expr = None
+    if "error" in dataset.schema.names:
+        # bulk_process.py rows that failed have no classification to replay
+        filter_expr = ds.field("error").is_null()
+    if since:
+        since_expr = ds.field("processed_at") >= since
+        filter_expr = since_expr if filter_expr is None else filter_expr & since_expr
+    if until:
+        until_expr = ds.field("processed_at") < until
+        filter_expr = until_expr if filter_expr is None else filter_expr & until_expr
+    return to_columns(dataset.to_table(columns=wanted, filter=filter_expr))
+
+
+def _rates_by(column, escalated: np.ndarray) -> Dict[str, Dict]:
+    codes, categories = column
+    counts = np.bincount(codes, minlength=len(categories))
+    hits = np.bincount(codes, weights=escalated, minlength=len(categories))
+    return {
+        category: {"count": int(count), "rate": float(hit / count) if count else 0.0}
+        for category, count, hit in zip(categories, counts, hits)
+    }
+
+
+def replay(factors: Dict, scenarios: List[Dict], baseline: Dict = None) -> Dict:
+    """
+    Re-score every stored ticket under each scenario ({"threshold", "weights",
+    "critical_topics"}) and report escalation-rate deltas against `baseline`
+    (default: the current configuration) overall, by topic and by priority.
+    """
+    baseline_escalated = score_batch(factors, **(baseline or {}))["should_escalate"].astype(np.float64)
+    base_topic = _rates_by(factors["topic"], baseline_escalated)
+    base_priority = _rates_by(factors["priority"], baseline_escalated)
+    total = factors["num_rows"]
+    base_rate = float(baseline_escalated.mean()) if total else 0.0
+
+    results = []
+    for scenario in scenarios:
+        escalated = score_batch(factors, **scenario)["should_escalate"].astype(np.float64)
+        rate = float(escalated.mean()) if total else 0.0
+
+        def _deltas(by, base):
+            return {
+                key: {
+                    "count": value["count"],
+                    "rate": value["rate"],
+                    "delta": value["rate"] - base[key]["rate"],
+                }
+                for key, value in by.items()
+            }
+
+        results.append({
+            "scenario": scenario,
+            "escalation_rate": rate,
+            "delta": rate - base_rate,
+            "by_topic": _deltas(_rates_by(factors["topic"], escalated), base_topic),
+            "by_priority": _deltas(_rates_by(factors["priority"], escalated), base_priority),
+        })
+
+    return {"tickets": total, "baseline_rate": base_rate, "scenarios": results}
+
+
+class EscalationFactorStore:
+    """
+    Buffers escalation factors for processed tickets and appends them to a
+    Parquet directory in part files of `flush_rows` rows.
+    """
+
+    def __init__(self, path: str, flush_rows: int = 500):
+        self.path = path
+        self.flush_rows = flush_rows
+        self._rows: List[Dict] = []
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def append(self, features: Dict, decision: Dict):
+        row = {
+            **features,
+            **decision["factors"],
+            "escalation_score": decision["escalation_score"],
+            "should_escalate": decision["should_escalate"],
+            "processed_at": datetime.now().isoformat(),
+        }
+        with self._lock:
+            self._rows.append(row)
+            if len(self._rows) < self.flush_rows:
+                return
+            rows, self._rows = self._rows, []
+        self._write(rows)
+
+    def flush(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if rows:
+            self._write(rows)
+
+    def _write(self, rows: List[Dict]):
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            name = f"factors-{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}.parquet"
+            table = pa.Table.from_pylist(rows, schema=FACTOR_SCHEMA)
+            tmp_path = os.path.join(self.path, f".{name}.tmp")
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, os.path.join(self.path, name))
+        except Exception as e:
+            print(f"[Warning] Could not write escalation factors: {e}")
@@ -1,10 +1,18 @@
+import asyncio
+import contextvars
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict
 from langchain_google_genai import ChatGoogleGenerativeAI
 from agent import ticket_agent
 from agent import rag_agent  # Full RAGAgent
 from agent import quality_agent
+from agent.classifier_agent import local_sentiment_analysis
 from dotenv import load_dotenv
+import tracing
 
 # --- Load environment and initialize LLM ---
 load_dotenv()
@@ -23,6 +31,102 @@ _rag_agent_instance = rag_agent.RAGAgent()
 
 _quality_agent = quality_agent.QualityAgent()
 
+# Start classification + retrieval alongside the RAG/NO_RAG decision instead of after it
+SPECULATIVE_RAG = os.getenv("MQUERY_SPECULATIVE_RAG", "false").lower() in ("1", "true", "yes")
+SPECULATIVE_RAG_WORKERS = int(os.getenv("MQUERY_SPECULATIVE_WORKERS", 8))
+_speculation_pool = None
+_speculation_pool_lock = threading.Lock()
+
+
+def _get_speculation_pool() -> ThreadPoolExecutor:
+    # Created on first use (benchmarks switch SPECULATIVE_RAG on after import); the lock
+    # keeps concurrent first turns from each creating a pool and leaking all but one
+    global _speculation_pool
+    with _speculation_pool_lock:
+        if _speculation_pool is None:
+            _speculation_pool = ThreadPoolExecutor(max_workers=SPECULATIVE_RAG_WORKERS,
+                                                   thread_name_prefix="speculative-rag")
+        return _speculation_pool
+
+
+def _needs_rag(decision: str) -> bool:
+    # "NO_RAG" contains "RAG", so check for it first
+    return "RAG" in decision and "NO_RAG" not in decision
+
+
+class _Speculation:
+    """
+    RAGAgent.classify_and_retrieve for a turn, started before the routing
+    decision returns. Outcomes are counted on /api/metrics:
+    hit (decision was RAG), miss (NO_RAG, work discarded), reused (RAG, but
+    a duplicate ticket's cached draft was used instead) and not_started
+    (the pool was busy, so the work was cancelled before it began).
+    """
+
+    def __init__(self, user_input: str):
+        self.user_input = user_input
+        self.started = time.perf_counter()
+        # Copy the context so spans still land in the current request trace
+        self.future = _get_speculation_pool().submit(contextvars.copy_context().run, self._run)
+
+    def _run(self):
+        with tracing.span("mquery.speculative_rag"):
+            return _rag_agent_instance.classify_and_retrieve(self.user_input)
+
+    def result(self):
+        """Speculative (classification, draft_answer), or None if it never started."""
+        if self.future.cancel():
+            tracing.incr("copilot_speculative_rag_total", outcome="not_started")
+            return None
+        tracing.incr("copilot_speculative_rag_total", outcome="hit")
+        return self.future.result()
+
+    def discard(self, outcome: str = "miss"):
+        if self.future.cancel():
+            tracing.incr("copilot_speculative_rag_total", outcome="not_started")
+            return
+        tracing.incr("copilot_speculative_rag_total", outcome=outcome)
+        # A running thread can't be interrupted; count its time once it finishes
+        self.future.add_done_callback(
+            lambda _: tracing.incr("copilot_speculative_rag_wasted_seconds_total",
+                                   time.perf_counter() - self.started)
+        )
+
+
+async def _aspeculate(user_input: str):
+    with tracing.span("mquery.speculative_rag"):
+        return await _rag_agent_instance.aclassify_and_retrieve(user_input)
+
+
+def _discard_task(task: asyncio.Task, started: float, outcome: str = "miss"):
+    tracing.incr("copilot_speculative_rag_total", outcome=outcome)
+    if task.done():
+        # Retrieve any exception so asyncio doesn't warn about it
+        if not task.cancelled():
+            task.exception()
+    else:
+        task.cancel()
+    # Retrieval already handed to an executor thread still runs; only the awaited steps stop
+    tracing.incr("copilot_speculative_rag_wasted_seconds_total", time.perf_counter() - started)
+
+
+def speculation_stats() -> Dict:
+    """Speculative RAG outcomes so far, with the hit rate among speculations that ran."""
+    counters = tracing.counters()
+    outcomes = {dict(key).get("outcome"): int(value)
+                for key, value in counters.get("copilot_speculative_rag_total", {}).items()}
+    hit, miss = outcomes.get("hit", 0), outcomes.get("miss", 0)
+    return {
+        "enabled": SPECULATIVE_RAG,
+        "hit": hit,
+        "miss": miss,
+        "reused": outcomes.get("reused", 0),
+        "not_started": outcomes.get("not_started", 0),
+        "hit_rate": round(hit / (hit + miss), 3) if hit + miss else None,
+        "wasted_seconds": round(sum(counters.get("copilot_speculative_rag_wasted_seconds_total", {}).values()), 3),
+    }
+
+
 class MultiQueryAgent:
     def __init__(self):
         self.history: List[Dict[str, str]] = []
@@ -31,7 +135,9 @@ class MultiQueryAgent:
     def add_to_history(self, role: str, content: str):
         self.history.append({"role": role, "content": content})
 
-    def generate_response(self, user_input: str) -> str:
+    # --- Steps shared by generate_response and agenerate_response ---
+    def _begin(self, user_input: str):
+        """Record the user turn. Returns (context_text, (greeting answer, log) or None)."""
         self.add_to_history("user", user_input)
 
         # Build last 6 messages for context
@@ -58,10 +164,12 @@ class MultiQueryAgent:
             self.add_to_history("assistant", answer)
             self.last_log = log
             print("\nLog:", log)
-            return answer
+            return context_text, (answer, log)
+        return context_text, None
 
-        # --- Decide if RAG is needed ---
-        decision_prompt = f"""
+    @staticmethod
+    def _decision_prompt(context_text: str) -> str:
+        return f"""
         You are a Customer Support Copilot. Given the following conversation, decide whether the user query requires knowledge from documentation or developer resources.
         Respond with either "RAG" or "NO_RAG".
 
@@ -70,36 +178,36 @@ class MultiQueryAgent:
 
         Decision:
         """
-        decision_resp = llm.invoke(decision_prompt).content.strip().upper()
 
-        factors = {}
+    @staticmethod
+    def _rag_escalation(rag_result: Dict):
+        """Escalation based on RAG factors. Returns (factors, reasoning, should_escalate)."""
+        factors = rag_result.get("escalation", {}).get("factors", {})
         reasoning = []
         should_escalate = False
-        ticket_id = None
-        sources = []
-
-        if "RAG" in decision_resp:
-            # Call full RAGAgent
-            rag_result = _rag_agent_instance.process_query(user_input)
-
-            # Escalation based on RAG factors
-            factors = rag_result.get("escalation", {}).get("factors", {})
-            if factors.get("sentiment_urgency", 0) >= 0.6:
-                should_escalate = True
-                reasoning.append("High urgency detected")
-            if factors.get("topic_criticality", 0) >= 0.6:
-                should_escalate = True
-                reasoning.append("Critical topic")
-
-            ticket_id = ticket_agent.create_ticket(
+        if factors.get("sentiment_urgency", 0) >= 0.6:
+            should_escalate = True
+            reasoning.append("High urgency detected")
+        if factors.get("topic_criticality", 0) >= 0.6:
+            should_escalate = True
+            reasoning.append("Critical topic")
+        return factors, reasoning, should_escalate
+
+    @staticmethod
+    def _create_ticket(user_input: str, rag_result: Dict) -> str:
+        with tracing.span("mquery.create_ticket"):
+            return ticket_agent.create_ticket(
                 query=user_input,
                 classification=rag_result.get("classification", {}),
                 response=rag_result.get("draft_answer", ""),
                 escalation_info=rag_result.get("escalation", {}),
             )
 
-            # LLM generates final answer using retrieved content
-            combined_prompt = f"""
+    @staticmethod
+    def _answer_prompt(user_input: str, context_text: str, rag_result: Dict,
+                       should_escalate: bool, reasoning: List[str]) -> str:
+        # LLM generates final answer using retrieved content
+        return f"""
             You are a helpful AI assistant.
             - Answer the user's query using the retrieved content.
             - Conversation context is provided below.
@@ -119,45 +227,43 @@ class MultiQueryAgent:
             - If Escalation Required is True, politely inform the user that their query has also been routed to our support team.
             - Include all relevant information from the retrieved content in your response.
             """
-            answer = llm.invoke(combined_prompt).content.strip()
-            sources = rag_result.get("sources", [])
-            log_type = "ai_escalation" if should_escalate else "ai_response"
 
-        else:
-            # Normal fallback
-            fallback_prompt = f"""
+    @staticmethod
+    def _fallback_prompt(context_text: str) -> str:
+        # Normal fallback
+        return f"""
             You are a helpful AI assistant. Continue the conversation with the user based on the following context:
             {context_text}
             Respond conversationally and politely.
             """
-            answer = llm.invoke(fallback_prompt).content.strip()
-            log_type = "ai_response"
-
-        # --- Response Quality Check on final LLM answer ---
-        context_found = rag_result.get("context_found", True) if "rag_result" in locals() else True
-
-        qa_eval = _quality_agent.evaluate(
-            user_query=user_input,
-            final_response=answer,
-            context_found=context_found
-        )
 
+    def _finish(self, answer: str, log_type: str, rag_result: Dict, factors: Dict,
+                reasoning: List[str], should_escalate: bool, ticket_id, sources: List[str],
+                qa_eval: Dict, duplicate_of: str = None):
+        """Log the turn and record it in history. Returns (answer with sources, log)."""
         factors["response_quality"] = qa_eval["response_quality"]
         should_escalate = should_escalate or qa_eval["should_escalate"]
         reasoning.extend(qa_eval["reasoning"])
 
+        # A good RAG turn's retrieval becomes the cached resolution for later duplicates of this ticket
+        if ticket_id is not None and duplicate_of is None and not should_escalate:
+            ticket_agent.record_resolution(
+                ticket_id, rag_result.get("draft_answer", ""), sources,
+                classification=rag_result.get("classification"),
+            )
 
         # Build structured log
         log = {
             "Type": log_type,
             "Content": answer,
-            "Classification": rag_result.get("classification", {}) if "rag_result" in locals() else "N/A",
-            "Escalation Score": rag_result.get("escalation", {}).get("escalation_score", 0.0) if "rag_result" in locals() else 0.0,
+            "Classification": rag_result.get("classification", {}) if rag_result is not None else "N/A",
+            "Escalation Score": rag_result.get("escalation", {}).get("escalation_score", 0.0) if rag_result is not None else 0.0,
             "Factors": factors,
             "Reasoning": reasoning,
             "Sources": sources,
             "Ticket ID": ticket_id,
             "Should Escalate": should_escalate,
+            "Duplicate Of": duplicate_of,
         }
 
         self.add_to_history("assistant", answer)
@@ -168,18 +274,217 @@ class MultiQueryAgent:
         if sources:
             answer += "\n\nSources:\n" + "\n".join(f"- {s}" for s in sources)
 
-        return answer
+        return answer, log
+
+    @staticmethod
+    def _reused_retrieval(user_input: str, resolution: Dict):
+        """
+        (classification, draft_answer) for a near-duplicate of a resolved ticket:
+        topic, priority and the retrieved draft come from its cluster, while
+        sentiment is this customer's own so escalation is scored afresh.
+        """
+        with tracing.span("classifier.sentiment"):
+            sentiment = local_sentiment_analysis(user_input)
+        return dict(resolution["classification"], sentiment=sentiment), resolution["draft_answer"]
+
+    def generate_response(self, user_input: str, return_log: bool = False):
+        """
+        Answer one turn. With return_log, returns (answer, log): read the log
+        from here rather than `last_log`, which concurrent turns overwrite.
+        """
+        answer, log = self._respond(user_input)
+        return (answer, log) if return_log else answer
+
+    async def agenerate_response(self, user_input: str, return_log: bool = False):
+        """
+        Async generate_response for the ASGI server: LLM calls are awaited and
+        CPU-bound work (sentiment, embeddings, FAISS) runs in the default executor.
+        """
+        answer, log = await self._arespond(user_input)
+        return (answer, log) if return_log else answer
+
+    def _respond(self, user_input: str):
+        context_text, greeting = self._begin(user_input)
+        if greeting is not None:
+            return greeting
+
+        speculation = _Speculation(user_input) if SPECULATIVE_RAG else None
+
+        # --- Decide if RAG is needed ---
+        try:
+            with tracing.span("mquery.decision_llm") as s:
+                decision_response = llm.invoke(self._decision_prompt(context_text))
+                s.record_llm(decision_response)
+        except Exception:
+            if speculation is not None:
+                speculation.discard()
+            raise
+        decision_resp = decision_response.content.strip().upper()
+
+        rag_result = None
+        factors = {}
+        reasoning = []
+        should_escalate = False
+        ticket_id = None
+        sources = []
+        duplicate_of = None
+
+        if _needs_rag(decision_resp):
+            with tracing.span("mquery.duplicate_lookup"):
+                resolution = ticket_agent.find_resolution(user_input)
+
+            # Call full RAGAgent
+            with tracing.span("mquery.rag_agent"):
+                if resolution is not None:
+                    if speculation is not None:
+                        speculation.discard(outcome="reused")
+                    prepared = self._reused_retrieval(user_input, resolution)
+                    duplicate_of = resolution["cluster_id"]
+                else:
+                    prepared = speculation.result() if speculation is not None else None
+                if prepared is not None:
+                    rag_result = _rag_agent_instance.escalate(user_input, *prepared)
+                else:
+                    rag_result = _rag_agent_instance.process_query(user_input)
+            factors, reasoning, should_escalate = self._rag_escalation(rag_result)
+            ticket_id = self._create_ticket(user_input, rag_result)
+
+            with tracing.span("mquery.answer_llm") as s:
+                answer_response = llm.invoke(
+                    self._answer_prompt(user_input, context_text, rag_result, should_escalate, reasoning)
+                )
+                s.record_llm(answer_response)
+            answer = answer_response.content.strip()
+            sources = rag_result.get("sources", [])
+            log_type = "ai_escalation" if should_escalate else "ai_response"
+
+        else:
+            if speculation is not None:
+                speculation.discard()
+            with tracing.span("mquery.fallback_llm") as s:
+                answer_response = llm.invoke(self._fallback_prompt(context_text))
+                s.record_llm(answer_response)
+            answer = answer_response.content.strip()
+            log_type = "ai_response"
+
+        # --- Response Quality Check on final LLM answer ---
+        context_found = rag_result.get("context_found", True) if rag_result is not None else True
+
+        with tracing.span("mquery.quality"):
+            qa_eval = _quality_agent.evaluate(
+                user_query=user_input,
+                final_response=answer,
+                context_found=context_found
+            )
+
+        return self._finish(answer, log_type, rag_result, factors, reasoning,
+                            should_escalate, ticket_id, sources, qa_eval, duplicate_of)
+
+    async def _arespond(self, user_input: str):
+        context_text, greeting = self._begin(user_input)
+        if greeting is not None:
+            return greeting
+
+        speculation = asyncio.create_task(_aspeculate(user_input)) if SPECULATIVE_RAG else None
+        speculation_started = time.perf_counter()
+
+        try:
+            with tracing.span("mquery.decision_llm") as s:
+                decision_response = await llm.ainvoke(self._decision_prompt(context_text))
+                s.record_llm(decision_response)
+        except BaseException:
+            if speculation is not None:
+                _discard_task(speculation, speculation_started)
+            raise
+        decision_resp = decision_response.content.strip().upper()
+
+        rag_result = None
+        factors = {}
+        reasoning = []
+        should_escalate = False
+        ticket_id = None
+        sources = []
+        duplicate_of = None
+
+        if _needs_rag(decision_resp):
+            with tracing.span("mquery.duplicate_lookup"):
+                resolution = await asyncio.to_thread(ticket_agent.find_resolution, user_input)
+
+            with tracing.span("mquery.rag_agent"):
+                if resolution is not None:
+                    if speculation is not None:
+                        _discard_task(speculation, speculation_started, outcome="reused")
+                    prepared = await asyncio.to_thread(self._reused_retrieval, user_input, resolution)
+                    duplicate_of = resolution["cluster_id"]
+                elif speculation is not None:
+                    tracing.incr("copilot_speculative_rag_total", outcome="hit")
+                    prepared = await speculation
+                else:
+                    prepared = None
+                if prepared is not None:
+                    rag_result = await _rag_agent_instance.aescalate(user_input, *prepared)
+                else:
+                    rag_result = await _rag_agent_instance.aprocess_query(user_input)
+            factors, reasoning, should_escalate = self._rag_escalation(rag_result)
+            ticket_id = await asyncio.to_thread(self._create_ticket, user_input, rag_result)
+
+            with tracing.span("mquery.answer_llm") as s:
+                answer_response = await llm.ainvoke(
+                    self._answer_prompt(user_input, context_text, rag_result, should_escalate, reasoning)
+                )
+                s.record_llm(answer_response)
+            answer = answer_response.content.strip()
+            sources = rag_result.get("sources", [])
+            log_type = "ai_escalation" if should_escalate else "ai_response"
+
+        else:
+            if speculation is not None:
+                _discard_task(speculation, speculation_started)
+            with tracing.span("mquery.fallback_llm") as s:
+                answer_response = await llm.ainvoke(self._fallback_prompt(context_text))
+                s.record_llm(answer_response)
+            answer = answer_response.content.strip()
+            log_type = "ai_response"
+
+        context_found = rag_result.get("context_found", True) if rag_result is not None else True
+
+        with tracing.span("mquery.quality"):
+            qa_eval = await _quality_agent.aevaluate(
+                user_query=user_input,
+                final_response=answer,
+                context_found=context_found
+            )
+
+        return self._finish(answer, log_type, rag_result, factors, reasoning,
+                            should_escalate, ticket_id, sources, qa_eval, duplicate_of)
 
 
 # ---- Wrapper for app.py ----
 _agent_instance = MultiQueryAgent()
 
+# Per-client conversations for the API, least recently used evicted first
+MAX_SESSIONS = int(os.getenv("MQUERY_MAX_SESSIONS", 1000))
+_sessions: "OrderedDict[str, MultiQueryAgent]" = OrderedDict()
+_sessions_lock = threading.Lock()
+
+
+def get_agent(session_id: str = None) -> MultiQueryAgent:
+    """The conversation agent for `session_id`, or the shared agent when there is none."""
+    if not session_id:
+        return _agent_instance
+    with _sessions_lock:
+        agent = _sessions.get(session_id)
+        if agent is None:
+            agent = _sessions[session_id] = MultiQueryAgent()
+            while len(_sessions) > MAX_SESSIONS:
+                _sessions.popitem(last=False)
+        else:
+            _sessions.move_to_end(session_id)
+        return agent
+
 
 def handle_message(user_query, return_log=False):
-    response = _agent_instance.generate_response(user_query)
-    if return_log:
-        return response, getattr(_agent_instance, "last_log", None)
-    return response
+    return _agent_instance.generate_response(user_query, return_log=return_log)
 
 
 # Example standalone usage
@@ -2,6 +2,7 @@
 from typing import Dict
 from langchain_google_genai import ChatGoogleGenerativeAI
 import os, re, json
+import tracing
 from dotenv import load_dotenv
 
 # --- Load env and init LLM ---
@@ -25,8 +26,8 @@ class QualityAgent:
     def __init__(self):
         pass
 
-    def evaluate(self, user_query: str, final_response: str, context_found: bool) -> Dict:
-        prompt = f"""
+    def _build_prompt(self, user_query: str, final_response: str, context_found: bool) -> str:
+        return f"""
         You are a support QA evaluator.
 
         Task:
@@ -54,8 +55,27 @@ class QualityAgent:
         }}
         """
 
-        raw = llm.invoke(prompt).content.strip()
-
+    def evaluate(self, user_query: str, final_response: str, context_found: bool) -> Dict:
+        prompt = self._build_prompt(user_query, final_response, context_found)
+        with tracing.span("quality.llm") as s:
+            response = llm.invoke(prompt)
+            s.record_llm(response)
+        raw = response.content.strip()
+
+        with tracing.span("quality.parse"):
+            return self._parse(raw, context_found)
+
+    async def aevaluate(self, user_query: str, final_response: str, context_found: bool) -> Dict:
+        prompt = self._build_prompt(user_query, final_response, context_found)
+        with tracing.span("quality.llm") as s:
+            response = await llm.ainvoke(prompt)
+            s.record_llm(response)
+        raw = response.content.strip()
+
+        with tracing.span("quality.parse"):
+            return self._parse(raw, context_found)
+
+    def _parse(self, raw: str, context_found: bool) -> Dict:
         try:
             # Extract JSON substring safely
             match = re.search(r"\{.*\}", raw, re.DOTALL)
@@ -1,110 +1,82 @@
 # rag_agent.py
+import asyncio
 import os
 from typing import Dict
 from dotenv import load_dotenv
-from agent.classifier_agent import classify_ticket
+import tracing
+from agent.classifier_agent import aclassify_ticket, classify_ticket
+from agent.escalation_batch import EscalationDecisionEngine, EscalationFactorStore, extract_features
 from rag import retrieval
 
 load_dotenv()
 
-
-class EscalationDecisionEngine:
-    def __init__(self, escalation_threshold: float = None):
-        if escalation_threshold is None:
-            escalation_threshold = float(os.getenv("ESCALATION_THRESHOLD", 0.6))
-        self.escalation_threshold = escalation_threshold
-
-    def score(self, query: str, classification: Dict, draft_answer: str = None) -> Dict:
-        """Return escalation decision + reasoning (no text response)."""
-
-        # --- Query complexity ---
-        complexity = 0.0
-        if "?" in query:
-            complexity += 0.3
-        if len(query.split()) > 50:
-            complexity += 0.2
-        if any(word in query.lower() for word in ["integrate", "custom", "setup", "troubleshoot"]):
-            complexity += 0.2
-
-        # --- Sentiment/urgency ---
-        sentiment = classification.get("sentiment", "Neutral")
-        priority = classification.get("priority", "P2")
-        sentiment_urgency = 0.0
-        if sentiment == "Angry":
-            sentiment_urgency += 0.9
-        elif sentiment == "Frustrated":
-            sentiment_urgency += 0.7
-        if priority == "P0":
-            sentiment_urgency += 0.8
-        elif priority == "P1":
-            sentiment_urgency += 0.4
-
-        # --- Topic criticality ---
-        topic = classification.get("topic", "Unknown")
-        critical_topics = {
-            "Sensitive data": 0.9,
-            "Security": 0.8,
-            "Billing": 0.7,
-            "Compliance": 0.8,
-            "Integration": 0.6,
-            "Custom": 0.7,
-        }
-        topic_criticality = critical_topics.get(topic, 0.2)
-
-        # --- Response quality ---
-        response_quality = 0.0
-
-        # --- Weighted score ---
-        weights = {
-            "complexity": 0.3,
-            "sentiment_urgency": 0.3,
-            "topic_criticality": 0.3,
-            "response_quality": 0.1,
-        }
-        factors = {
-            "complexity": complexity,
-            "sentiment_urgency": sentiment_urgency,
-            "topic_criticality": topic_criticality,
-            "response_quality": response_quality,
-        }
-        escalation_score = sum(factors[k] * weights[k] for k in weights)
-        should_escalate = escalation_score > self.escalation_threshold
-
-        reasoning = []
-        if factors["complexity"] > 0.3:
-            reasoning.append("Complex query")
-        if factors["sentiment_urgency"] > 0.7:
-            reasoning.append("High urgency/sentiment")
-        if factors["topic_criticality"] > 0.7:
-            reasoning.append("Critical topic")
-        if factors["response_quality"] > 0.3:
-            reasoning.append("Low answer quality")
-
-        return {
-            "should_escalate": should_escalate,
-            "escalation_score": escalation_score,
-            "factors": factors,
-            "reasoning": reasoning,
-        }
+# Columnar escalation factors for every processed ticket (empty path disables)
+ESCALATION_STORE_PATH = os.getenv("ESCALATION_STORE_PATH", "data/escalation_factors")
+_factor_store = EscalationFactorStore(
+    ESCALATION_STORE_PATH, int(os.getenv("ESCALATION_STORE_FLUSH_ROWS", 500))
+) if ESCALATION_STORE_PATH else None
 
 
 class RAGAgent:
-    def __init__(self, escalation_threshold: float = None):
+    def __init__(self, escalation_threshold: float = None, record_factors: bool = True):
         self.escalation_engine = EscalationDecisionEngine(escalation_threshold)
+        # Off for offline runs (bulk processing, benchmarks) so they stay out of the replay store
+        self.record_factors = record_factors
 
     def process_query(self, query: str) -> Dict:
         """
         Classify, retrieve draft, and score escalation.
         Does NOT produce final LLM response.
         """
+        classification, draft_answer = self.classify_and_retrieve(query)
+        return self.escalate(query, classification, draft_answer)
+
+    async def aprocess_query(self, query: str) -> Dict:
+        """
+        Async process_query: the classification LLM call is awaited, while
+        embedding/FAISS retrieval and scoring run in the default executor.
+        """
+        classification, draft_answer = await self.aclassify_and_retrieve(query)
+        return await self.aescalate(query, classification, draft_answer)
+
+    def classify_and_retrieve(self, query: str):
+        """First half of process_query. Has no side effects, so it is safe to run speculatively."""
         # --- Classify query ---
-        classification = classify_ticket(query)
+        with tracing.span("rag.classify"):
+            classification = classify_ticket(query)
 
         # --- Retrieval ---
-        draft_answer = retrieval.retrieve_and_answer(query, k=3)  # Removed 'return_sources'
-
+        with tracing.span("rag.retrieval"):
+            draft_answer = retrieval.retrieve_and_answer(
+                query, k=3, topic=classification.get("topic")
+            )
+        return classification, draft_answer
+
+    async def aclassify_and_retrieve(self, query: str):
+        with tracing.span("rag.classify"):
+            classification = await aclassify_ticket(query)
+
+        with tracing.span("rag.retrieval"):
+            draft_answer = await asyncio.to_thread(
+                retrieval.retrieve_and_answer, query, 3, classification.get("topic")
+            )
+        return classification, draft_answer
+
+    def escalate(self, query: str, classification: Dict, draft_answer: str) -> Dict:
+        """Second half of process_query: score escalation and record the factors."""
         # --- Escalation decision ---
-        decision = self.escalation_engine.score(query, classification, draft_answer)
+        with tracing.span("rag.escalation"):
+            decision = self._score(query, classification, draft_answer)
+
+        return {
+            "classification": classification,
+            "draft_answer": draft_answer,
+            "escalation": decision,
+        }
+
+    async def aescalate(self, query: str, classification: Dict, draft_answer: str) -> Dict:
+        with tracing.span("rag.escalation"):
+            decision = await asyncio.to_thread(self._score, query, classification, draft_answer)
 
         return {
             "classification": classification,
@@ -112,6 +84,12 @@ class RAGAgent:
             "escalation": decision,
         }
 
+    def _score(self, query: str, classification: Dict, draft_answer: str) -> Dict:
+        decision = self.escalation_engine.score(query, classification, draft_answer)
+        if self.record_factors and _factor_store is not None:
+            _factor_store.append(extract_features(query, classification), decision)
+        return decision
+
 
 # Example usage
 if __name__ == "__main__":
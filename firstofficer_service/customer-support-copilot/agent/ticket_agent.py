@@ -1,14 +1,44 @@
+import os
 import time
 import random
 import string
-from typing import Dict
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional
 from datetime import datetime
+from dotenv import load_dotenv
+import tracing
+from agent.duplicate_index import DuplicateIndex
+from rag import retrieval
+
+load_dotenv()
+
+# Cosine similarity above which a new ticket is linked to an open ticket as a duplicate
+DUPLICATE_THRESHOLD = float(os.getenv("TICKET_DUPLICATE_THRESHOLD", 0.8))
+# Stricter similarity above which a cluster's cached resolution is reused
+REUSE_THRESHOLD = float(os.getenv("TICKET_REUSE_THRESHOLD", 0.9))
+# Only tickets created within this window are considered
+DUPLICATE_WINDOW_HOURS = float(os.getenv("TICKET_DUPLICATE_WINDOW_HOURS", 24))
+MAX_DUPLICATE_LINKS = int(os.getenv("TICKET_MAX_DUPLICATE_LINKS", 5))
+
+
+@lru_cache(maxsize=256)
+def _embed(text: str):
+    # Same MiniLM model as retrieval; cached because a turn embeds its query more than once
+    with tracing.span("tickets.embed"):
+        return retrieval.embedding.embed_query(text)
 
 
 class TicketAgent:
     def __init__(self):
         self.tickets: Dict[str, Dict] = {}
         self.ticket_counter = 0
+        # Duplicate clusters keyed by the id of their first ticket, least recently active first
+        self.clusters: "OrderedDict[str, Dict]" = OrderedDict()
+        self.window_seconds = DUPLICATE_WINDOW_HOURS * 3600
+        self.duplicate_index = DuplicateIndex(window_seconds=self.window_seconds)
+        self._lock = threading.RLock()
 
     def generate_ticket_id(self) -> str:
         """
@@ -16,15 +46,21 @@ class TicketAgent:
         Format: TICK-{timestamp}-{counter}-{random_suffix}
         """
         timestamp = int(time.time() * 1000)  # milliseconds
-        self.ticket_counter += 1
+        with self._lock:
+            self.ticket_counter += 1
+            counter = self.ticket_counter
         random_suffix = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
-        ticket_id = f"TICK-{timestamp}-{self.ticket_counter:04d}-{random_suffix}"
+        ticket_id = f"TICK-{timestamp}-{counter:04d}-{random_suffix}"
         return ticket_id
 
     def create_ticket(self, query: str, classification: Dict, response: str, escalation_info: Dict = None) -> str:
         """
         Create a new ticket with minimal associated data.
+        It is linked to its nearest open duplicates and joins their cluster.
         """
+        vector = _embed(query)
+        duplicates = self.duplicate_index.search(vector, k=MAX_DUPLICATE_LINKS, min_similarity=DUPLICATE_THRESHOLD)
+
         ticket_id = self.generate_ticket_id()
         ticket_data = {
             "ticket_id": ticket_id,
@@ -32,18 +68,167 @@ class TicketAgent:
             "classification": classification,
             "response": response,
             "escalation_info": escalation_info or {},
-            "created_at": datetime.now().isoformat()
+            "created_at": datetime.now().isoformat(),
+            "status": "open",
+            "duplicate_of": [{"ticket_id": dup_id, "similarity": round(score, 3)} for dup_id, score in duplicates],
         }
-        self.tickets[ticket_id] = ticket_data
+
+        with self._lock:
+            cluster = None
+            if duplicates and duplicates[0][0] in self.tickets:
+                cluster = self.clusters.get(self.tickets[duplicates[0][0]]["cluster_id"])
+            if cluster is None:
+                cluster = self.clusters[ticket_id] = {
+                    "cluster_id": ticket_id,
+                    "query": query,
+                    "topic": classification.get("topic", "Unknown") if isinstance(classification, dict) else "Unknown",
+                    "tickets": [],
+                    "resolution": None,
+                    "reused": 0,
+                    "first_seen": ticket_data["created_at"],
+                }
+            else:
+                tracing.incr("copilot_ticket_duplicates_total", outcome="linked")
+            cluster["tickets"].append(ticket_id)
+            cluster["last_seen"] = ticket_data["created_at"]
+            cluster["last_active"] = time.time()
+            self.clusters.move_to_end(cluster["cluster_id"])
+            ticket_data["cluster_id"] = cluster["cluster_id"]
+            self.tickets[ticket_id] = ticket_data
+            self._prune(cluster["last_active"])
+
+        self.duplicate_index.add(ticket_id, vector)
         return ticket_id
 
+    def find_resolution(self, query: str) -> Optional[Dict]:
+        """
+        Cached retrieval of the closest open duplicate, if it is similar
+        enough to skip topic classification and retrieval.
+        """
+        matches = self.duplicate_index.search(_embed(query), k=1, min_similarity=REUSE_THRESHOLD)
+        if not matches:
+            return None
+        matched_id, similarity = matches[0]
+        with self._lock:
+            ticket = self.tickets.get(matched_id)
+            cluster = self.clusters.get(ticket["cluster_id"]) if ticket is not None else None
+            if cluster is None or cluster["resolution"] is None:
+                return None
+            cluster["reused"] += 1
+            tracing.incr("copilot_ticket_duplicates_total", outcome="reused")
+            return dict(cluster["resolution"], cluster_id=cluster["cluster_id"],
+                        matched_ticket=matched_id, similarity=round(similarity, 3))
+
+    def record_resolution(self, ticket_id: str, draft_answer: str, sources: List[str] = None,
+                          classification: Dict = None):
+        """
+        Cache a non-escalated ticket's retrieved draft as its cluster's resolution.
+        Only what follows from the ticket text is kept: the conversational answer,
+        sentiment and escalation decision belong to one customer and are never reused.
+        """
+        with self._lock:
+            ticket = self.tickets.get(ticket_id)
+            if ticket is None:
+                return
+            classification = classification or ticket["classification"]
+            cluster = self.clusters[ticket["cluster_id"]]
+            cluster["resolution"] = {
+                "draft_answer": draft_answer,
+                "sources": sources or [],
+                "classification": {
+                    "topic": classification.get("topic", "Unknown"),
+                    "priority": classification.get("priority", "P2"),
+                },
+                "resolved_by": ticket_id,
+                "resolved_at": datetime.now().isoformat(),
+            }
+
+    def invalidate_resolutions(self, *_):
+        """Drop cached answers, e.g. after the knowledge base index changes. Links are kept."""
+        with self._lock:
+            for cluster in self.clusters.values():
+                cluster["resolution"] = None
+
+    def close_ticket(self, ticket_id: str) -> bool:
+        with self._lock:
+            ticket = self.tickets.get(ticket_id)
+            if ticket is None:
+                return False
+            ticket["status"] = "closed"
+            self.duplicate_index.remove(ticket_id)
+            # Nothing in a fully closed cluster can be matched any more
+            cluster = self.clusters[ticket["cluster_id"]]
+            if all(self.tickets[t]["status"] == "closed" for t in cluster["tickets"]):
+                self._drop_cluster(cluster)
+        return True
+
+    def _prune(self, now: float):
+        """Drop clusters with no ticket inside the duplicate window. Caller holds self._lock."""
+        if not self.window_seconds:
+            return
+        while self.clusters:
+            cluster = next(iter(self.clusters.values()))
+            if now - cluster["last_active"] <= self.window_seconds:
+                break
+            self._drop_cluster(cluster)
+
+    def _drop_cluster(self, cluster: Dict):
+        # Caller holds self._lock
+        del self.clusters[cluster["cluster_id"]]
+        for ticket_id in cluster["tickets"]:
+            del self.tickets[ticket_id]
+            self.duplicate_index.remove(ticket_id)
+
+    def duplicate_clusters(self, min_size: int = 2, limit: int = 50) -> List[Dict]:
+        """Clusters with at least `min_size` tickets, largest first, for the dashboard."""
+        with self._lock:
+            self._prune(time.time())
+            clusters = [
+                {
+                    "cluster_id": cluster["cluster_id"],
+                    "query": cluster["query"],
+                    "topic": cluster["topic"],
+                    "size": len(cluster["tickets"]),
+                    "open": sum(1 for t in cluster["tickets"] if self.tickets[t]["status"] == "open"),
+                    "tickets": cluster["tickets"][-20:],
+                    "has_resolution": cluster["resolution"] is not None,
+                    "reused": cluster["reused"],
+                    "first_seen": cluster["first_seen"],
+                    "last_seen": cluster["last_seen"],
+                }
+                for cluster in self.clusters.values()
+                if len(cluster["tickets"]) >= min_size
+            ]
+        clusters.sort(key=lambda c: (c["size"], c["last_seen"]), reverse=True)
+        return clusters[:limit]
+
 
 # ---- Global instance for use in mquery_agent.py ----
 _ticket_agent = TicketAgent()
 
+# Cached drafts were retrieved from the old documents; don't reuse them after an index swap
+retrieval.index_manager.on_swap(_ticket_agent.invalidate_resolutions)
+
 
 def create_ticket(query: str, classification: Dict, response: str, escalation_info: Dict = None) -> str:
     """
     Wrapper for creating tickets directly.
     """
     return _ticket_agent.create_ticket(query, classification, response, escalation_info)
+
+
+def find_resolution(query: str) -> Optional[Dict]:
+    return _ticket_agent.find_resolution(query)
+
+
+def record_resolution(ticket_id: str, draft_answer: str, sources: List[str] = None,
+                      classification: Dict = None):
+    _ticket_agent.record_resolution(ticket_id, draft_answer, sources, classification)
+
+
+def close_ticket(ticket_id: str) -> bool:
+    return _ticket_agent.close_ticket(ticket_id)
+
+
+def duplicate_clusters(min_size: int = 2, limit: int = 50) -> List[Dict]:
+    return _ticket_agent.duplicate_clusters(min_size, limit)
@@ -1,117 +1,125 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import time
-from agent.classifier_agent import classify_ticket
-from agent.mquery_agent import handle_message, _agent_instance as mquery_agent
-from agent.rag_agent import RAGAgent
+import functools
+import os
+import endpoints
+import profiling
+import tracing
 from rag import retrieval
-import json
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for React frontend
 
-rag_agent = RAGAgent()
+# Pick up newly published index versions without a restart (0 disables polling)
+retrieval.index_manager.start_watcher(float(os.getenv("RAG_INDEX_WATCH_INTERVAL", 30)))
+
+
+def _json(result):
+    payload, status_code = result
+    return jsonify(payload), status_code
+
+
+def _wants_profile(req):
+    """
+    Admins can profile a single request with X-Profile: 1 and get the output
+    paths back; PROFILE_REQUEST_RATE samples the rest, logged server-side only.
+    Returns (profile, return_paths).
+    """
+    if req.headers.get("X-Profile") == "1" and endpoints.is_admin(req.headers):
+        return True, True
+    return profiling.should_sample_request(), False
+
+
+def _traced(stage):
+    """
+    Time the endpoint as `stage`. On request, attach the stage breakdown and,
+    for admin X-Profile requests, the sampling-profiler output files to JSON responses.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            profile_active, return_paths = _wants_profile(request)
+            with profiling.profile_request(stage, profile_active) as profile, \
+                    tracing.request_trace(endpoints.wants_trace(request.headers, request.args)) as trace, \
+                    tracing.span(stage):
+                payload, status_code = fn(*args, **kwargs)
+            if isinstance(payload, dict):
+                if trace is not None:
+                    payload["trace"] = trace
+                if profile and return_paths:
+                    payload["profile"] = profile
+            return jsonify(payload), status_code
+        return wrapper
+    return decorator
 
 @app.route('/api/health', methods=['GET'])
 def health():
-    return jsonify({"status": "healthy", "message": "Backend API is running"})
+    return _json(endpoints.health())
 
 @app.route('/api/tickets', methods=['GET'])
 def get_tickets():
     """Fetch sample tickets for dashboard"""
-    try:
-        with open('data/sample_tickets.json', 'r') as f:
-            tickets = json.load(f)
-        return jsonify({"tickets": tickets})
-    except FileNotFoundError:
-        return jsonify({"tickets": [], "error": "Sample tickets file not found"})
+    return _json(endpoints.sample_tickets())
+
+@app.route('/api/tickets/clusters', methods=['GET'])
+def ticket_clusters():
+    """Near-duplicate ticket clusters, largest first"""
+    min_size = request.args.get('min_size', 2, type=int)
+    limit = request.args.get('limit', 50, type=int)
+    return _json(endpoints.ticket_clusters(min_size=min_size, limit=limit))
+
+@app.route('/api/tickets/<ticket_id>/close', methods=['POST'])
+def close_ticket(ticket_id):
+    """Close a ticket so new tickets are no longer linked to it"""
+    return _json(endpoints.close_ticket(request.headers, ticket_id))
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Per-stage latency histograms and LLM token counters in Prometheus text format"""
+    return Response(tracing.render_prometheus(), mimetype="text/plain; version=0.0.4")
 
 @app.route('/api/classify', methods=['POST'])
+@_traced("api.classify")
 def classify():
     """Classify a single ticket"""
-    start_time = time.time()
-    data = request.get_json()
-    if not data or 'text' not in data:
-        return jsonify({"error": "Missing 'text' field in request"}), 400
-
-    ticket_text = data['text']
-    try:
-        classification = classify_ticket(ticket_text)
-        processing_time = int((time.time() - start_time) * 1000)  # ms
-
-        return jsonify({
-            "classification": classification,
-            "processing_time": processing_time,
-            "confidence": 95  # Placeholder, can be enhanced
-        })
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    return endpoints.classify(request.get_json(silent=True))
 
 @app.route('/api/chat', methods=['POST'])
+@_traced("api.chat")
 def chat():
     """Handle conversational queries with full agent analysis"""
-    start_time = time.time()
-    data = request.get_json()
-    if not data or 'query' not in data:
-        return jsonify({"error": "Missing 'query' field in request"}), 400
-
-    user_query = data['query']
-    try:
-        # Use RAG Agent for processing
-        result = rag_agent.process_query(user_query)
-
-        processing_time = int((time.time() - start_time) * 1000)  # ms
-
-        return jsonify({
-            "query": user_query,
-            "type": result['type'],
-            "response": result['content'],
-            "classification": result['classification'],
-            "escalation_score": result['escalation_score'],
-            "factors": result['factors'],
-            "reasoning": result['reasoning'],
-            "sources": result['sources'],
-            "processing_time": processing_time,
-            "confidence": 90,  # Placeholder
-            "agents_used": ["rag_agent", "classifier"],  # Updated
-            "analysis_details": f"Query classified as {result['classification'].get('topic', 'Unknown')} with {result['classification'].get('sentiment', 'Neutral')} sentiment. Escalation score: {result['escalation_score']:.2f}."
-        })
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    return endpoints.chat(request.get_json(silent=True))
 
 @app.route('/api/rag', methods=['POST'])
+@_traced("api.rag")
 def rag_endpoint():
     """Direct RAG agent processing with escalation logic"""
-    start_time = time.time()
-    data = request.get_json()
-    if not data or 'query' not in data:
-        return jsonify({"error": "Missing 'query' field in request"}), 400
-
-    user_query = data['query']
-    try:
-        result = rag_agent.process_query(user_query)
-        processing_time = int((time.time() - start_time) * 1000)
-        return jsonify(result | {"processing_time": processing_time})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    return endpoints.rag(request.get_json(silent=True))
 
 @app.route('/api/mquery', methods=['POST'])
+@_traced("api.mquery")
 def mquery_endpoint():
     """Multi-query agent for conversational responses"""
-    start_time = time.time()
-    data = request.get_json()
-    if not data or 'query' not in data:
-        return jsonify({"error": "Missing 'query' field in request"}), 400
-
-    user_query = data['query']
-    try:
-        response = mquery_agent.generate_response(user_query)
-        processing_time = int((time.time() - start_time) * 1000)
-        return jsonify({
-            "query": user_query,
-            "response": response,
-            "processing_time": processing_time,
-            "agent": "mquery"
-        })
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+    return endpoints.mquery(request.get_json(silent=True))
+
+@app.route('/api/admin/index', methods=['GET'])
+def index_status():
+    """Report the live vector index version and any versions still draining"""
+    return _json(endpoints.index_status(request.headers))
+
+@app.route('/api/admin/index/reload', methods=['POST'])
+def index_reload():
+    """Load an index version in the background and swap it in once validated"""
+    return _json(endpoints.index_reload(request.headers, request.get_json(silent=True)))
+
+@app.route('/api/escalation/replay', methods=['POST'])
+def escalation_replay():
+    """Replay alternate escalation thresholds/weights over stored tickets"""
+    return _json(endpoints.escalation_replay(request.headers, request.get_json(silent=True)))
+
+@app.route('/api/admin/profile', methods=['GET', 'POST'])
+def profile_window():
+    """Sample every thread for a fixed window and write collapsed stacks + flamegraph to PROFILE_DIR"""
+    if request.method == 'GET':
+        return _json(endpoints.profile_status(request.headers))
+    return _json(endpoints.profile_window(request.headers, request.get_json(silent=True)))
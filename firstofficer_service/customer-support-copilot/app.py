@@ -1,21 +1,51 @@
-import streamlit as st
+import os
+import uuid
+from collections import Counter
+
 import pandas as pd
-from agent import mquery_agent   # conversational agent
+import requests
+import streamlit as st
+from dotenv import load_dotenv
+
+# The UI is a thin client: models and LLM clients live in the API process (api.py / asgi_api.py)
+load_dotenv()
+API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:5000").rstrip("/")
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", 120))
+PAGE_SIZES = [10, 25, 50, 100]
+# Most recent chat messages rendered; older ones are shown on request
+RECENT_MESSAGES = 20
 
 st.set_page_config(page_title="Customer Support Copilot", layout="wide")
 st.title("🛠 Customer Support Copilot ")
 
-# Initialize session state containers
-if "messages" not in st.session_state:
-    st.session_state.messages = []
 
-if "logs" not in st.session_state:
-    st.session_state.logs = []
+@st.cache_resource
+def api_session() -> requests.Session:
+    """One pooled HTTP session per Streamlit server, shared by all browser sessions."""
+    return requests.Session()
+
+
+@st.cache_data(ttl=10, show_spinner=False)
+def fetch_clusters():
+    try:
+        response = api_session().get(f"{API_BASE_URL}/api/tickets/clusters", timeout=10)
+        response.raise_for_status()
+        return response.json().get("clusters", [])
+    except requests.RequestException:
+        return []
+
+
+def send_message(query: str):
+    response = api_session().post(
+        f"{API_BASE_URL}/api/mquery",
+        json={"query": query, "session_id": st.session_state.session_id},
+        timeout=API_TIMEOUT,
+    )
+    payload = response.json()
+    if response.status_code != 200:
+        raise RuntimeError(payload.get("error", f"API returned {response.status_code}"))
+    return payload["response"], payload.get("log") or {}
 
-# ----------------------------
-# Ticket Dashboard (top)
-# ----------------------------
-st.subheader("📊 Ticket Dashboard")
 
 def _normalize_classification(c):
     """Return a safe dict for classification (handle 'N/A' string cases)."""
@@ -23,30 +53,75 @@ def _normalize_classification(c):
         return {}
     return c
 
+
 def _truncate(text: str, length: int = 120):
     if not isinstance(text, str):
         return ""
     return (text[:length] + "…") if len(text) > length else text
 
-if st.session_state.logs:
-    table_rows = []
-    for log in st.session_state.logs:
-        classification = _normalize_classification(log.get("Classification", {}))
-        assistant_resp = log.get("Assistant Response")
-        # Fallbacks
-        if assistant_resp is None:
-            assistant_resp = log.get("Content", "")
-
-        table_rows.append({
-            "Ticket ID": log.get("Ticket ID", "-"),
-            "Topic": classification.get("topic", "-"),
-            "Sentiment": classification.get("sentiment", "-"),
-            "Priority": classification.get("priority", "-"),
-            "Response": _truncate(assistant_resp, 120),
-            "Should Escalate": log.get("Should Escalate", False),
-        })
-
-    df = pd.DataFrame(table_rows)
+
+def add_log(log: dict):
+    """Append a turn's log and update the table rows and aggregates with just that turn."""
+    classification = _normalize_classification(log.get("Classification", {}))
+    assistant_resp = log.get("Assistant Response")
+    # Fallbacks
+    if assistant_resp is None:
+        assistant_resp = log.get("Content", "")
+
+    row = {
+        "Ticket ID": log.get("Ticket ID") or "-",
+        "Topic": classification.get("topic", "-"),
+        "Sentiment": classification.get("sentiment", "-"),
+        "Priority": classification.get("priority", "-"),
+        "Response": _truncate(assistant_resp, 120),
+        "Should Escalate": bool(log.get("Should Escalate", False)),
+    }
+    st.session_state.logs.append(log)
+    st.session_state.rows.append(row)
+    stats = st.session_state.stats
+    stats["topic"][row["Topic"]] += 1
+    stats["priority"][row["Priority"]] += 1
+    stats["escalated"] += int(row["Should Escalate"])
+
+
+# Initialize session state containers
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+if "messages" not in st.session_state:
+    st.session_state.messages = []
+
+if "logs" not in st.session_state:
+    st.session_state.logs = []
+    # Derived from logs one turn at a time, never rebuilt
+    st.session_state.rows = []
+    st.session_state.stats = {"topic": Counter(), "priority": Counter(), "escalated": 0}
+
+# ----------------------------
+# Ticket Dashboard (top)
+# ----------------------------
+st.subheader("📊 Ticket Dashboard")
+
+rows = st.session_state.rows
+if rows:
+    stats = st.session_state.stats
+    total, escalated = len(rows), stats["escalated"]
+    col_total, col_escalated, col_rate = st.columns(3)
+    col_total.metric("Turns", total)
+    col_escalated.metric("Escalated", escalated)
+    col_rate.metric("Escalation rate", f"{escalated / total:.0%}")
+
+    col_topic, col_priority = st.columns(2)
+    col_topic.bar_chart(pd.Series(stats["topic"], name="Tickets"))
+    col_priority.bar_chart(pd.Series(stats["priority"], name="Tickets"))
+
+    # Only the current page is turned into a DataFrame and styled
+    col_page, col_size = st.columns([3, 1])
+    page_size = col_size.selectbox("Rows per page", PAGE_SIZES, index=1)
+    pages = (total - 1) // page_size + 1
+    page = col_page.number_input(f"Page (of {pages}, newest first)", min_value=1, max_value=pages, value=1)
+    end = total - (page - 1) * page_size
+    df = pd.DataFrame(rows[max(0, end - page_size):end][::-1])
 
     # Apply color coding based on escalation
     def highlight_escalation(row):
@@ -64,13 +139,29 @@ if st.session_state.logs:
 else:
     st.info("No tickets generated yet. Start a conversation to see tickets here!")
 
+clusters = fetch_clusters()
+if clusters:
+    with st.expander(f"🔁 Duplicate clusters ({len(clusters)})"):
+        st.dataframe(pd.DataFrame([{
+            "Issue": _truncate(c["query"], 80),
+            "Topic": c["topic"],
+            "Tickets": c["size"],
+            "Open": c["open"],
+            "Cached Draft": c["has_resolution"],
+            "Reused": c["reused"],
+            "Last Seen": c["last_seen"],
+        } for c in clusters]), use_container_width=True)
+
 # ----------------------------
 # Support Agent (below dashboard)
 # ----------------------------
 st.subheader("🤖 Support Agent")
 
 # Display past conversation
-for msg in st.session_state.messages:
+messages = st.session_state.messages
+if len(messages) > RECENT_MESSAGES and not st.toggle(f"Show {len(messages) - RECENT_MESSAGES} earlier messages"):
+    messages = messages[-RECENT_MESSAGES:]
+for msg in messages:
     if msg["role"] == "user":
         st.markdown(f"🧑 **You:** {msg['content']}")
     else:
@@ -80,23 +171,12 @@ for msg in st.session_state.messages:
 user_query = st.text_input("Enter your message:", key="user_input")
 
 if st.button("Send") and user_query and user_query.strip():
-    # Append user message
-    st.session_state.messages.append({"role": "user", "content": user_query})
-
     with st.spinner("Agent is thinking..."):
-        # Get response + structured log from the multi-query agent
-        # handle_message returns (response, log) when return_log=True
-        result = mquery_agent.handle_message(user_query, return_log=True)
-        # Some variations of the wrapper may return just response (older versions).
-        if isinstance(result, tuple) and len(result) == 2:
-            response, log_entry = result
-        else:
-            response = result
-            log_entry = {}
-
-    # Ensure log_entry is a dict
-    if log_entry is None:
-        log_entry = {}
+        try:
+            response, log_entry = send_message(user_query)
+        except (requests.RequestException, RuntimeError, ValueError) as e:
+            st.error(f"⚠️ Could not reach the support API at {API_BASE_URL}: {e}")
+            st.stop()
 
     # Add assistant's final response into log so dashboard shows the final reply
     log_entry["Assistant Response"] = response
@@ -105,20 +185,27 @@ if st.button("Send") and user_query and user_query.strip():
     if "Classification" not in log_entry:
         log_entry["Classification"] = "N/A"
     if "Ticket ID" not in log_entry:
-        # preserve existing None if present; otherwise set None
-        log_entry["Ticket ID"] = log_entry.get("Ticket ID", None)
+        log_entry["Ticket ID"] = None
 
-    # Save assistant response + structured log
+    # Save user message, assistant response + structured log
+    st.session_state.messages.append({"role": "user", "content": user_query})
     st.session_state.messages.append({"role": "assistant", "content": response})
-    st.session_state.logs.append(log_entry)
+    add_log(log_entry)
+    fetch_clusters.clear()
 
     # Refresh UI
     st.rerun()
 
 # ----------------------------
-# Sidebar: Raw conversation logs
+# Sidebar: Raw conversation logs, one turn at a time on request
 # ----------------------------
 st.sidebar.header("Conversation Logs (raw)")
-for i, log in enumerate(st.session_state.logs, 1):
-    st.sidebar.markdown(f"**Turn {i}:**")
-    st.sidebar.json(log)
+if st.session_state.logs:
+    turns = len(st.session_state.logs)
+    if st.sidebar.toggle("Show raw log"):
+        turn = st.sidebar.number_input("Turn", min_value=1, max_value=turns, value=turns)
+        st.sidebar.json(st.session_state.logs[turn - 1])
+    else:
+        st.sidebar.caption(f"{turns} turns logged")
+else:
+    st.sidebar.caption("No turns yet")
@@ -0,0 +1,291 @@
+# asgi_api.py
+"""
+Async serving mode for the same endpoints as api.py.
+
+    uvicorn asgi_api:app --host 0.0.0.0 --port 5000
+
+Gemini calls are awaited instead of holding a worker thread, so one process
+can keep hundreds of LLM-bound conversations in flight. CPU-bound work
+(sentiment model, embeddings, FAISS) runs on a bounded thread pool set as the
+event loop's default executor. Each endpoint has its own concurrency limit and
+bounded wait queue: when the queue is full the request gets 429, when it waits
+longer than the queue timeout it gets 503, both with Retry-After.
+"""
+import asyncio
+import functools
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+import endpoints
+import tracing
+from rag import retrieval
+
+load_dotenv()
+
+# Threads for CPU-bound inference (sentiment, embeddings, FAISS); LLM calls don't use them
+INFERENCE_WORKERS = int(os.getenv("ASGI_INFERENCE_WORKERS", os.cpu_count() or 4))
+
+
+def _limit_setting(name: str, endpoint: str, default: str) -> str:
+    """ASGI_<NAME>_<ENDPOINT> overrides ASGI_<NAME> for one endpoint."""
+    return os.getenv(f"ASGI_{name}_{endpoint.upper()}", os.getenv(f"ASGI_{name}", default))
+
+
+class Overloaded(Exception):
+    def __init__(self, status_code: int, retry_after: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.message = message
+
+
+class AdmissionLimiter:
+    """
+    At most `max_concurrency` requests run at once; up to `max_queue` more
+    wait, each for at most `queue_timeout` seconds. Retry-After is estimated
+    from a moving average of how long admitted requests take.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.avg_service_s = 1.0
+
+    @classmethod
+    def from_env(cls, endpoint: str) -> "AdmissionLimiter":
+        return cls(
+            endpoint,
+            max_concurrency=int(_limit_setting("MAX_CONCURRENCY", endpoint, "256")),
+            max_queue=int(_limit_setting("MAX_QUEUE", endpoint, "512")),
+            queue_timeout=float(_limit_setting("QUEUE_TIMEOUT", endpoint, "30")),
+        )
+
+    def retry_after(self) -> int:
+        # Time for everything queued ahead to drain at the current service rate
+        return max(1, math.ceil(self.avg_service_s * (self.waiting + 1) / self.max_concurrency))
+
+    @asynccontextmanager
+    async def admit(self):
+        if self.active + self.waiting >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            raise Overloaded(429, self.retry_after(), f"Too many queued '{self.name}' requests")
+
+        self.waiting += 1
+        try:
+            # Not wait_for: on 3.11 it can time out after the acquire succeeded and leak the permit.
+            # asyncio.timeout cancels in this task, so a completed acquire is never discarded.
+            async with asyncio.timeout(self.queue_timeout):
+                await self._semaphore.acquire()
+        except TimeoutError:
+            self.timed_out += 1
+            raise Overloaded(503, self.retry_after(), f"Timed out waiting for a '{self.name}' slot")
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        self.admitted += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.avg_service_s = 0.8 * self.avg_service_s + 0.2 * (time.perf_counter() - started)
+            self._semaphore.release()
+
+    def status(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_service_s": round(self.avg_service_s, 3),
+        }
+
+
+limiters = {endpoint: AdmissionLimiter.from_env(endpoint) for endpoint in ("classify", "chat", "rag", "mquery")}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # asyncio.to_thread() runs on the default executor, so this bounds all offloaded inference
+    executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
+    asyncio.get_running_loop().set_default_executor(executor)
+    # Pick up newly published index versions without a restart (0 disables polling)
+    retrieval.index_manager.start_watcher(float(os.getenv("RAG_INDEX_WATCH_INTERVAL", 30)))
+    print(f"🚀 Async API ready ({INFERENCE_WORKERS} inference threads)")
+    yield
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        {"error": exc.message, "retry_after": exc.retry_after},
+        status_code=exc.status_code,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def _admitted(endpoint: str):
+    """
+    Run the endpoint under its AdmissionLimiter, time it as api.<endpoint> and,
+    on request, attach the stage breakdown to the JSON response.
+    """
+    stage = f"api.{endpoint}"
+    limiter = limiters[endpoint]
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(request: Request):
+            async with limiter.admit():
+                with tracing.request_trace(endpoints.wants_trace(request.headers, request.query_params)) as trace, \
+                        tracing.span(stage):
+                    payload, status_code = await fn(request)
+            if trace is not None and isinstance(payload, dict):
+                payload["trace"] = trace
+            return JSONResponse(payload, status_code=status_code)
+        return wrapper
+    return decorator
+
+
+def _json(result):
+    payload, status_code = result
+    return JSONResponse(payload, status_code=status_code)
+
+
+async def _json_body(request: Request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+@app.get("/api/health")
+async def health():
+    return _json(endpoints.health())
+
+
+@app.get("/api/tickets")
+async def get_tickets():
+    """Fetch sample tickets for dashboard"""
+    return _json(endpoints.sample_tickets())
+
+
+@app.get("/api/tickets/clusters")
+async def ticket_clusters(min_size: int = 2, limit: int = 50):
+    """Near-duplicate ticket clusters, largest first"""
+    return _json(endpoints.ticket_clusters(min_size=min_size, limit=limit))
+
+
+@app.post("/api/tickets/{ticket_id}/close")
+async def close_ticket(ticket_id: str, request: Request):
+    """Close a ticket so new tickets are no longer linked to it"""
+    return _json(endpoints.close_ticket(request.headers, ticket_id))
+
+
+@app.get("/api/metrics")
+async def metrics():
+    """Per-stage latency histograms, LLM token counters and admission queues in Prometheus text format"""
+    lines = [
+        "# HELP copilot_admission_requests Requests per endpoint by admission state.",
+        "# TYPE copilot_admission_requests gauge",
+    ]
+    for endpoint, limiter in limiters.items():
+        for state in ("active", "waiting"):
+            lines.append(f'copilot_admission_requests{{endpoint="{endpoint}",state="{state}"}} {getattr(limiter, state)}')
+    lines += [
+        "# HELP copilot_admission_total Admission decisions per endpoint.",
+        "# TYPE copilot_admission_total counter",
+    ]
+    for endpoint, limiter in limiters.items():
+        for outcome in ("admitted", "rejected", "timed_out"):
+            lines.append(f'copilot_admission_total{{endpoint="{endpoint}",outcome="{outcome}"}} {getattr(limiter, outcome)}')
+    body = tracing.render_prometheus() + "\n".join(lines) + "\n"
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+@app.post("/api/classify")
+@_admitted("classify")
+async def classify(request: Request):
+    """Classify a single ticket"""
+    return await endpoints.aclassify(await _json_body(request))
+
+
+@app.post("/api/chat")
+@_admitted("chat")
+async def chat(request: Request):
+    """Handle conversational queries with full agent analysis"""
+    return await endpoints.achat(await _json_body(request))
+
+
+@app.post("/api/rag")
+@_admitted("rag")
+async def rag_endpoint(request: Request):
+    """Direct RAG agent processing with escalation logic"""
+    return await endpoints.arag(await _json_body(request))
+
+
+@app.post("/api/mquery")
+@_admitted("mquery")
+async def mquery_endpoint(request: Request):
+    """Multi-query agent for conversational responses"""
+    return await endpoints.amquery(await _json_body(request))
+
+
+@app.get("/api/admin/limits")
+async def admission_status(request: Request):
+    """Current admission queue state per endpoint"""
+    if not endpoints.is_admin(request.headers):
+        return JSONResponse({"error": "Forbidden"}, status_code=403)
+    return {endpoint: limiter.status() for endpoint, limiter in limiters.items()}
+
+
+@app.get("/api/admin/index")
+async def index_status(request: Request):
+    """Report the live vector index version and any versions still draining"""
+    return _json(endpoints.index_status(request.headers))
+
+
+@app.post("/api/admin/index/reload")
+async def index_reload(request: Request):
+    """Load an index version in the background and swap it in once validated"""
+    # A waited reload loads and validates the whole index, so keep it off the event loop
+    return _json(await asyncio.to_thread(endpoints.index_reload, request.headers, await _json_body(request)))
+
+
+@app.post("/api/escalation/replay")
+async def escalation_replay(request: Request):
+    """Replay alternate escalation thresholds/weights over stored tickets"""
+    return _json(await asyncio.to_thread(endpoints.escalation_replay, request.headers, await _json_body(request)))
+
+
+@app.api_route("/api/admin/profile", methods=["GET", "POST"])
+async def profile_window(request: Request):
+    """Sample every thread for a fixed window and write collapsed stacks + flamegraph to PROFILE_DIR"""
+    if request.method == "GET":
+        return _json(endpoints.profile_status(request.headers))
+    return _json(endpoints.profile_window(request.headers, await _json_body(request)))
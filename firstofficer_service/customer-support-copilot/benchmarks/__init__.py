@@ -0,0 +1 @@
+"""Offline end-to-end benchmarks for the support copilot (no Gemini key needed)."""
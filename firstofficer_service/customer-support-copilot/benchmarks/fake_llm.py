@@ -0,0 +1,84 @@
+# benchmarks/fake_llm.py
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+
+TOPICS = ['How-to', 'Product', 'Connector', 'Lineage', 'API/SDK', 'SSO', 'Glossary', 'Best practices', 'Sensitive data']
+PRIORITIES = ['P0', 'P1', 'P2']
+
+
+def _digest(text: str) -> int:
+    return int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+class FakeResponse:
+    """Just enough of langchain's AIMessage for the agents."""
+
+    def __init__(self, content: str, prompt: str):
+        self.content = content
+        self.text = content
+        # Same rough estimate as rag/context_packer.count_tokens
+        self.usage_metadata = {
+            "input_tokens": max(1, len(prompt) // 4),
+            "output_tokens": max(1, len(content) // 4),
+        }
+
+
+class FakeLLM:
+    """
+    Deterministic stand-in for ChatGoogleGenerativeAI.
+
+    Answers are derived from a hash of the prompt, so every run sees the same
+    classifications and routing decisions. Each call sleeps for `latency_ms`
+    plus up to `jitter_ms` of seeded jitter to model network time.
+    `rag_ratio` is the share of routing decisions that come back "RAG".
+    """
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, rag_ratio: float = 0.8, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rag_ratio = rag_ratio
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _delay(self) -> float:
+        with self._lock:
+            self.calls += 1
+            jitter = self._random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+        return (self.latency_ms + jitter) / 1000.0
+
+    def _respond(self, prompt: str) -> str:
+        digest = _digest(prompt)
+        if "classifies support tickets" in prompt:
+            return json.dumps({
+                "topic": TOPICS[digest % len(TOPICS)],
+                "sentiment": "Neutral",
+                "priority": PRIORITIES[(digest // 7) % len(PRIORITIES)],
+            })
+        if '"RAG" or "NO_RAG"' in prompt:
+            return "RAG" if (digest % 1000) / 1000.0 < self.rag_ratio else "NO_RAG"
+        if "support QA evaluator" in prompt:
+            return json.dumps({
+                "response_quality": 0.8,
+                "should_escalate": False,
+                "reasoning": ["Benchmark evaluation"],
+            })
+        return "Here is what the documentation says about your question. " * (2 + digest % 4)
+
+    def invoke(self, prompt, *args, **kwargs) -> FakeResponse:
+        prompt = str(prompt)
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        return FakeResponse(self._respond(prompt), prompt)
+
+    async def ainvoke(self, prompt, *args, **kwargs) -> FakeResponse:
+        prompt = str(prompt)
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return FakeResponse(self._respond(prompt), prompt)
@@ -0,0 +1,43 @@
+# benchmarks/queries.py
+# Fixed query set, one group per documentation category in rag/data.
+# Keep this list stable: results are only comparable across commits if the
+# workload is identical.
+QUERIES = {
+    "Integrate": [
+        "How do I set up SSO authentication with SAML?",
+        "Okta SCIM provisioning is not creating users, how do I troubleshoot it?",
+        "Can I send messages and search assets from Slack?",
+        "How do I integrate Atlan with Jira Data Center?",
+    ],
+    "secure agent": [
+        "What are the system requirements for installing the virtual machine?",
+        "How does the secure agent execute workflows on AWS EKS?",
+    ],
+    "developer , introductory walkthru ,client sdks": [
+        "How do I authenticate with the Python SDK?",
+        "Is there a Java client for the Atlan API?",
+    ],
+    "find and understand data": [
+        "How do I add owners and certificates to an asset?",
+        "How should I interpret the timestamps on asset profiles?",
+    ],
+    "govern": [
+        "How do I create a data contract?",
+        "Can I see impact analysis for a change in GitHub?",
+    ],
+    "playbook": [
+        "How do I set up a playbook for data profiling?",
+        "My playbook is failing, how do I troubleshoot it?",
+    ],
+    "atlandoc-quickstart guide": [
+        "Where can I find the tenant logs for my workspace?",
+        "This is extremely urgent! Our production login is broken and I need it fixed immediately!",
+    ],
+    "help and support": [
+        "How do I contact Atlan support?",
+    ],
+}
+
+
+def all_queries():
+    return [query for queries in QUERIES.values() for query in queries]
@@ -0,0 +1,308 @@
+"""
+End-to-end benchmark with a stubbed LLM.
+
+Runs each pipeline stage over the fixed query set in benchmarks/queries.py
+against a deterministic FakeLLM, then measures throughput of
+MultiQueryAgent.generate_response at several client concurrencies. Results
+are written as JSON so runs can be compared across commits.
+
+Run from the project root:
+    python -m benchmarks.run --latency-ms 300 --concurrency 1 8 32
+    python -m benchmarks.run --compare benchmarks/results/<earlier>.json
+    python -m benchmarks.run --async-concurrency 64 256
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from benchmarks.fake_llm import FakeLLM
+from benchmarks.queries import all_queries
+
+# Lower is better for every metric compared here
+COMPARED_METRICS = ["p50_ms", "p95_ms", "p99_ms"]
+
+
+def _summary(samples_ms: List[float]) -> Dict:
+    values = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "count": int(values.size),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def load_modules(fake_llm: FakeLLM) -> Dict:
+    """Import the service modules (timed) and swap their LLM clients for `fake_llm`."""
+    # The agents refuse to import without a key; it is never used
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark-fake-key")
+    # The query set repeats, so cached duplicate drafts would be timed instead of classification
+    # and retrieval; cosine similarity never exceeds 1, so this turns reuse off
+    os.environ["TICKET_REUSE_THRESHOLD"] = "2"
+
+    timings = {}
+    started = time.perf_counter()
+    from rag import retrieval
+    timings["retrieval_import_s"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    from agent import classifier_agent
+    timings["classifier_import_s"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    from agent import mquery_agent, quality_agent, rag_agent
+    timings["agents_import_s"] = time.perf_counter() - started
+
+    # Keep benchmark traffic out of the production escalation store
+    mquery_agent._rag_agent_instance.record_factors = False
+
+    classifier_agent.llm = fake_llm
+    quality_agent.llm = fake_llm
+    mquery_agent.llm = fake_llm
+
+    # Sentiment model loads lazily; count its load as startup, not as query latency
+    started = time.perf_counter()
+    classifier_agent.load_sentiment_model()
+    timings["sentiment_model_load_s"] = time.perf_counter() - started
+
+    timings = {key: round(value, 3) for key, value in timings.items()}
+    timings["total_s"] = round(sum(timings.values()), 3)
+    return {
+        "timings": timings,
+        "retrieval": retrieval,
+        "classifier_agent": classifier_agent,
+        "rag_agent": rag_agent,
+        "mquery_agent": mquery_agent,
+    }
+
+
+def time_stage(fn: Callable[[str], object], queries: List[str], iterations: int) -> Dict:
+    samples = []
+    for _ in range(iterations):
+        for query in queries:
+            started = time.perf_counter()
+            fn(query)
+            samples.append((time.perf_counter() - started) * 1000)
+    return _summary(samples)
+
+
+def run_concurrency(modules: Dict, queries: List[str], clients: int, iterations: int) -> Dict:
+    """N clients, each with its own conversation, replaying the query set."""
+    def _client(client_id: int) -> List[float]:
+        agent = modules["mquery_agent"].MultiQueryAgent()
+        samples = []
+        for i in range(iterations):
+            for query in queries:
+                started = time.perf_counter()
+                agent.generate_response(query)
+                samples.append((time.perf_counter() - started) * 1000)
+        return samples
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(_client, range(clients)))
+    elapsed = time.perf_counter() - started
+
+    samples = [sample for client_samples in results for sample in client_samples]
+    summary = _summary(samples)
+    summary["clients"] = clients
+    summary["elapsed_s"] = round(elapsed, 3)
+    summary["throughput_rps"] = round(len(samples) / elapsed, 3) if elapsed else 0.0
+    return summary
+
+
+def run_async_concurrency(modules: Dict, queries: List[str], clients: int, iterations: int,
+                          inference_workers: int) -> Dict:
+    """Same as run_concurrency, but each client is a coroutine calling agenerate_response."""
+    async def _client(client_id: int) -> List[float]:
+        agent = modules["mquery_agent"].MultiQueryAgent()
+        samples = []
+        for i in range(iterations):
+            for query in queries:
+                started = time.perf_counter()
+                await agent.agenerate_response(query)
+                samples.append((time.perf_counter() - started) * 1000)
+        return samples
+
+    async def _main():
+        # Same bounded executor as asgi_api.py
+        with ThreadPoolExecutor(max_workers=inference_workers) as executor:
+            asyncio.get_running_loop().set_default_executor(executor)
+            return await asyncio.gather(*(_client(i) for i in range(clients)))
+
+    started = time.perf_counter()
+    results = asyncio.run(_main())
+    elapsed = time.perf_counter() - started
+
+    samples = [sample for client_samples in results for sample in client_samples]
+    summary = _summary(samples)
+    summary["clients"] = clients
+    summary["mode"] = "async"
+    summary["elapsed_s"] = round(elapsed, 3)
+    summary["throughput_rps"] = round(len(samples) / elapsed, 3) if elapsed else 0.0
+    return summary
+
+
+def run(latency_ms: float, jitter_ms: float, rag_ratio: float, iterations: int,
+        concurrency: List[int], seed: int = 0, async_concurrency: List[int] = (),
+        inference_workers: int = os.cpu_count() or 4, speculative: bool = False) -> Dict:
+    fake_llm = FakeLLM(latency_ms=latency_ms, jitter_ms=jitter_ms, rag_ratio=rag_ratio, seed=seed)
+    modules = load_modules(fake_llm)
+    modules["mquery_agent"].SPECULATIVE_RAG = speculative
+    queries = all_queries()
+
+    # Warm-up pass so one-off lazy initialisation doesn't skew the percentiles
+    modules["rag_agent"].RAGAgent(record_factors=False).process_query(queries[0])
+
+    rag = modules["rag_agent"].RAGAgent(record_factors=False)
+    stages = {
+        "retrieve_and_answer": time_stage(modules["retrieval"].retrieve_and_answer, queries, iterations),
+        "local_sentiment_analysis": time_stage(
+            modules["classifier_agent"].local_sentiment_analysis, queries, iterations
+        ),
+        "classify_ticket": time_stage(modules["classifier_agent"].classify_ticket, queries, iterations),
+        "rag_process_query": time_stage(rag.process_query, queries, iterations),
+        "mquery_generate_response": time_stage(
+            lambda q: modules["mquery_agent"].MultiQueryAgent().generate_response(q), queries, iterations
+        ),
+    }
+
+    throughput = [run_concurrency(modules, queries, clients, iterations) for clients in concurrency]
+    throughput += [
+        run_async_concurrency(modules, queries, clients, iterations, inference_workers)
+        for clients in async_concurrency
+    ]
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "queries": len(queries),
+            "iterations": iterations,
+            "llm_latency_ms": latency_ms,
+            "llm_jitter_ms": jitter_ms,
+            "rag_ratio": rag_ratio,
+            "seed": seed,
+            "speculative_rag": speculative,
+            "llm_calls": fake_llm.calls,
+        },
+        "speculation": modules["mquery_agent"].speculation_stats(),
+        "startup": modules["timings"],
+        "stages": stages,
+        "throughput": throughput,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Return a line per metric that got slower than `tolerance` (relative)."""
+    regressions = []
+
+    def _check(name, now, before):
+        if before and now > before * (1 + tolerance):
+            regressions.append(f"{name}: {before:.3f} -> {now:.3f} (+{(now / before - 1) * 100:.1f}%)")
+
+    for stage, stats in current["stages"].items():
+        old = baseline.get("stages", {}).get(stage)
+        if old:
+            for metric in COMPARED_METRICS:
+                _check(f"{stage}.{metric}", stats[metric], old[metric])
+
+    old_throughput = {
+        (entry.get("mode", "threads"), entry["clients"]): entry for entry in baseline.get("throughput", [])
+    }
+    for entry in current["throughput"]:
+        mode = entry.get("mode", "threads")
+        old = old_throughput.get((mode, entry["clients"]))
+        if old and old["throughput_rps"]:
+            # Throughput is higher-is-better, so compare the inverse
+            label = entry["clients"] if mode == "threads" else f"{entry['clients']}-{mode}"
+            _check(f"throughput@{label}.s_per_request",
+                   1 / entry["throughput_rps"], 1 / old["throughput_rps"])
+
+    _check("startup.total_s", current["startup"]["total_s"], baseline.get("startup", {}).get("total_s"))
+    _check("peak_rss_mb", current["peak_rss_mb"], baseline.get("peak_rss_mb"))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark with a stubbed LLM.")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Fake LLM latency per call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Extra seeded random latency per call")
+    parser.add_argument("--rag-ratio", type=float, default=0.8, help="Share of turns routed to RAG")
+    parser.add_argument("--iterations", type=int, default=1, help="Passes over the query set per stage")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Client counts")
+    parser.add_argument("--async-concurrency", type=int, nargs="*", default=[],
+                        help="Concurrent conversations for the async path (agenerate_response)")
+    parser.add_argument("--inference-workers", type=int, default=os.cpu_count() or 4,
+                        help="Executor threads for the async path")
+    parser.add_argument("--speculative", action="store_true",
+                        help="Run retrieval + classification alongside the routing decision")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="benchmarks/results", help="Directory for the JSON result")
+    parser.add_argument("--compare", help="Earlier result JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative slowdown")
+    args = parser.parse_args()
+
+    result = run(args.latency_ms, args.jitter_ms, args.rag_ratio, args.iterations, args.concurrency, args.seed,
+                 args.async_concurrency, args.inference_workers, args.speculative)
+
+    os.makedirs(args.out, exist_ok=True)
+    out_path = os.path.join(args.out, f"{datetime.now():%Y%m%d-%H%M%S}-{result['meta']['commit']}.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+
+    print(f"\nStartup: {result['startup']['total_s']}s | peak RSS {result['peak_rss_mb']} MB")
+    for stage, stats in result["stages"].items():
+        print(f"{stage:<26} p50 {stats['p50_ms']:>9.1f}ms  p95 {stats['p95_ms']:>9.1f}ms  p99 {stats['p99_ms']:>9.1f}ms")
+    for entry in result["throughput"]:
+        mode = " (async)" if entry.get("mode") == "async" else ""
+        print(f"{entry['clients']:>3} clients{mode}: {entry['throughput_rps']:.2f} req/s (p95 {entry['p95_ms']:.1f}ms)")
+    if args.speculative:
+        spec = result["speculation"]
+        print(f"Speculative RAG: hit rate {spec['hit_rate']} | {spec['miss']} discarded | "
+              f"{spec['wasted_seconds']}s wasted")
+    print(f"✅ Results saved to {out_path}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print(f"\n⚠️ {len(regressions)} regression(s) vs {args.compare}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions vs {args.compare} (tolerance {args.tolerance:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
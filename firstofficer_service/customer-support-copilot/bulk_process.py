@@ -0,0 +1,311 @@
+"""
+Offline bulk ticket processing.
+
+Streams a JSON or JSONL ticket export (same shape as data/sample_tickets.json)
+through the RAG pipeline, or just classification + escalation scoring, and
+writes results incrementally as Parquet (or Arrow) part files. Progress is
+checkpointed after every batch so a crashed run resumes where it stopped.
+
+Usage:
+    python bulk_process.py data/sample_tickets.json --out output/bulk_run
+    python bulk_process.py tickets.jsonl --out output/bulk_run --mode classify --workers 16 --max-in-flight 8
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from agent.escalation_batch import extract_features
+
+# Leading underscore/dot keeps these out of pyarrow.dataset reads of the output dir
+CHECKPOINT_FILE = "_checkpoint.json"
+
+SCHEMA = pa.schema([
+    ("offset", pa.int64()),
+    ("ticket_id", pa.string()),
+    ("text", pa.string()),
+    ("mode", pa.string()),
+    ("topic", pa.string()),
+    ("sentiment", pa.string()),
+    ("priority", pa.string()),
+    ("has_question", pa.bool_()),
+    ("word_count", pa.int32()),
+    ("has_complexity_keyword", pa.bool_()),
+    ("escalation_score", pa.float64()),
+    ("should_escalate", pa.bool_()),
+    ("complexity", pa.float64()),
+    ("sentiment_urgency", pa.float64()),
+    ("topic_criticality", pa.float64()),
+    ("response_quality", pa.float64()),
+    ("reasoning", pa.list_(pa.string())),
+    ("draft_answer", pa.string()),
+    ("error", pa.string()),
+    ("latency_ms", pa.int64()),
+    ("processed_at", pa.string()),
+])
+
+
+# --- Input ---
+_SEPARATORS = re.compile(r"[\s,]*")
+
+
+def _iter_json_array(f, chunk_size: int = 1 << 20) -> Iterator[Dict]:
+    """Yield the elements of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer:
+        return
+    if buffer[0] != "[":
+        raise ValueError("Expected a JSON array of tickets")
+    pos = 1
+    eof = False
+    while True:
+        pos = _SEPARATORS.match(buffer, pos).end()
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                if pos >= len(buffer):
+                    return
+                raise
+            # Element spans the chunk boundary: drop what's consumed and read more
+            buffer = buffer[pos:]
+            pos = 0
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        pos = end
+        yield item
+
+
+def iter_tickets(path: str) -> Iterator[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            yield from _iter_json_array(f)
+
+
+def count_tickets(path: str) -> Optional[int]:
+    """Cheap total for ETA reporting (JSONL only; JSON arrays would need a full parse)."""
+    if not path.lower().endswith((".jsonl", ".ndjson")):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def ticket_text(ticket: Dict) -> str:
+    if ticket.get("text") or ticket.get("query"):
+        return ticket.get("text") or ticket.get("query")
+    subject = (ticket.get("subject") or "").strip()
+    body = (ticket.get("body") or "").strip()
+    return f"{subject}. {body}" if subject and body else subject or body
+
+
+# --- Processing ---
+class TicketProcessor:
+    """
+    Runs one ticket through the pipeline. `max_in_flight` bounds the number of
+    tickets concurrently inside the pipeline (and so the number of concurrent
+    LLM calls), independently of the worker pool size.
+    """
+
+    def __init__(self, mode: str, max_in_flight: int):
+        self.mode = mode
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        if mode == "full":
+            from agent.rag_agent import RAGAgent
+            # The part files written here already hold the escalation factors
+            self._agent = RAGAgent(record_factors=False)
+        else:
+            from agent.classifier_agent import classify_ticket
+            from agent.escalation_batch import EscalationDecisionEngine
+            self._classify = classify_ticket
+            self._engine = EscalationDecisionEngine()
+
+    def _run(self, text: str) -> Dict:
+        if self.mode == "full":
+            return self._agent.process_query(text)
+        classification = self._classify(text)
+        return {
+            "classification": classification,
+            "draft_answer": None,
+            "escalation": self._engine.score(text, classification),
+        }
+
+    def process(self, offset: int, ticket: Dict) -> Dict:
+        text = ticket_text(ticket)
+        row = {
+            "offset": offset,
+            "ticket_id": str(ticket.get("id", offset)),
+            "text": text,
+            "mode": self.mode,
+            "error": None,
+        }
+        started = time.time()
+        try:
+            with self._in_flight:
+                result = self._run(text)
+            classification = result.get("classification") or {}
+            escalation = result.get("escalation") or {}
+            factors = escalation.get("factors") or {}
+            row.update(extract_features(text, classification))
+            row.update({
+                "escalation_score": escalation.get("escalation_score"),
+                "should_escalate": escalation.get("should_escalate"),
+                "complexity": factors.get("complexity"),
+                "sentiment_urgency": factors.get("sentiment_urgency"),
+                "topic_criticality": factors.get("topic_criticality"),
+                "response_quality": factors.get("response_quality"),
+                "reasoning": escalation.get("reasoning"),
+                "draft_answer": result.get("draft_answer"),
+            })
+        except Exception as e:
+            row["error"] = f"{type(e).__name__}: {e}"
+        row["latency_ms"] = int((time.time() - started) * 1000)
+        row["processed_at"] = datetime.now().isoformat()
+        return row
+
+
+# --- Output & checkpointing ---
+def load_checkpoint(out_dir: str) -> Dict:
+    path = os.path.join(out_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(out_dir: str, checkpoint: Dict):
+    """Write the checkpoint atomically so a crash never leaves it half-written."""
+    path = os.path.join(out_dir, CHECKPOINT_FILE)
+    tmp_path = os.path.join(out_dir, f".{CHECKPOINT_FILE}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def write_part(out_dir: str, part: int, rows: List[Dict], fmt: str) -> str:
+    table = pa.Table.from_pylist(rows, schema=SCHEMA)
+    extension = "parquet" if fmt == "parquet" else "arrow"
+    path = os.path.join(out_dir, f"part-{part:06d}.{extension}")
+    tmp_path = os.path.join(out_dir, f".part-{part:06d}.{extension}.tmp")
+    if fmt == "parquet":
+        pq.write_table(table, tmp_path, compression="zstd")
+    else:
+        feather.write_feather(table, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _format_eta(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600:d}h{(seconds % 3600) // 60:02d}m{seconds % 60:02d}s"
+
+
+def run(input_path: str, out_dir: str, mode: str = "full", workers: int = 8,
+        max_in_flight: int = 4, batch_size: int = 500, fmt: str = "parquet",
+        total: Optional[int] = None) -> Dict:
+    os.makedirs(out_dir, exist_ok=True)
+    checkpoint = load_checkpoint(out_dir)
+    if checkpoint and (checkpoint.get("input") != os.path.abspath(input_path) or checkpoint.get("mode") != mode):
+        raise ValueError(
+            f"{out_dir} holds a checkpoint for {checkpoint.get('input')} ({checkpoint.get('mode')}); "
+            "use a different --out directory."
+        )
+    checkpoint = checkpoint or {
+        "input": os.path.abspath(input_path),
+        "mode": mode,
+        "format": fmt,
+        "next_offset": 0,
+        "parts": 0,
+        "errors": 0,
+    }
+    fmt = checkpoint.get("format", fmt)
+    start_offset = checkpoint["next_offset"]
+    if start_offset:
+        print(f"↩️ Resuming at ticket {start_offset} ({checkpoint['parts']} parts already written)")
+
+    if total is None:
+        total = count_tickets(input_path)
+
+    processor = TicketProcessor(mode, max_in_flight)
+    started = time.time()
+    processed = 0
+
+    def _flush(batch):
+        nonlocal processed
+        futures = [pool.submit(processor.process, offset, ticket) for offset, ticket in batch]
+        rows = [future.result() for future in futures]
+        write_part(out_dir, checkpoint["parts"], rows, fmt)
+        checkpoint["parts"] += 1
+        checkpoint["next_offset"] = batch[-1][0] + 1
+        checkpoint["errors"] += sum(1 for row in rows if row["error"])
+        save_checkpoint(out_dir, checkpoint)
+
+        processed += len(rows)
+        elapsed = time.time() - started
+        rate = processed / elapsed if elapsed else 0.0
+        progress = f"{checkpoint['next_offset']}"
+        eta = ""
+        if total:
+            progress += f"/{total}"
+            remaining = total - checkpoint["next_offset"]
+            if rate > 0:
+                eta = f", ETA {_format_eta(remaining / rate)}"
+        print(f"📦 {progress} tickets | {rate:.1f} tickets/s | errors {checkpoint['errors']}{eta}")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        batch = []
+        for offset, ticket in enumerate(iter_tickets(input_path)):
+            if offset < start_offset:
+                continue
+            batch.append((offset, ticket))
+            if len(batch) >= batch_size:
+                _flush(batch)
+                batch = []
+        if batch:
+            _flush(batch)
+
+    elapsed = time.time() - started
+    checkpoint["completed"] = True
+    save_checkpoint(out_dir, checkpoint)
+    print(f"✅ Processed {processed} tickets in {elapsed:.1f}s -> {out_dir}")
+    return checkpoint
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-process historical support tickets.")
+    parser.add_argument("input", help="JSON array or JSONL ticket export")
+    parser.add_argument("--out", required=True, help="Output directory for part files and checkpoint")
+    parser.add_argument("--mode", choices=["full", "classify"], default="full",
+                        help="full: RAGAgent.process_query; classify: classification + escalation only")
+    parser.add_argument("--workers", type=int, default=8, help="Worker threads")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="Max tickets inside the LLM pipeline at once")
+    parser.add_argument("--batch-size", type=int, default=500, help="Tickets per part file / checkpoint")
+    parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    parser.add_argument("--total", type=int, default=None, help="Total ticket count for ETA (JSON arrays)")
+    args = parser.parse_args()
+
+    run(args.input, args.out, mode=args.mode, workers=args.workers,
+        max_in_flight=args.max_in_flight, batch_size=args.batch_size,
+        fmt=args.format, total=args.total)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+What-if replay of escalation thresholds and weights over stored tickets.
+
+Reads escalation factors written by the API (ESCALATION_STORE_PATH) or by
+bulk_process.py and reports how the escalation rate would change, overall and
+by topic and priority, under each alternate configuration.
+
+Usage:
+    python escalation_replay.py --threshold 0.5 --threshold 0.7
+    python escalation_replay.py output/bulk_run --since 2026-09-01 --until 2026-10-01 \\
+        --weights '{"complexity": 0.2, "sentiment_urgency": 0.4}'
+"""
+import argparse
+import json
+import os
+import time
+
+from agent.escalation_batch import load_factors, replay
+
+
+def _print_breakdown(title, breakdown):
+    print(f"  {title}:")
+    for key, value in sorted(breakdown.items(), key=lambda item: -abs(item[1]["delta"])):
+        print(f"    {key:<16} n={value['count']:<9} rate={value['rate']:.3f} ({value['delta']:+.3f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay escalation thresholds/weights over stored tickets.")
+    parser.add_argument("path", nargs="?", default=os.getenv("ESCALATION_STORE_PATH", "data/escalation_factors"),
+                        help="Parquet or Arrow directory of stored escalation factors")
+    parser.add_argument("--format", choices=["parquet", "arrow"],
+                        help="Storage format of `path` (default: detected from the file names)")
+    parser.add_argument("--threshold", type=float, action="append", default=[],
+                        help="Alternate threshold (repeatable)")
+    parser.add_argument("--weights", action="append", default=[],
+                        help="Alternate weights as JSON, e.g. '{\"complexity\": 0.2}' (repeatable)")
+    parser.add_argument("--since", help="Only tickets processed at or after this ISO timestamp")
+    parser.add_argument("--until", help="Only tickets processed before this ISO timestamp")
+    parser.add_argument("--json", action="store_true", help="Print the raw JSON report")
+    args = parser.parse_args()
+
+    scenarios = [{"threshold": threshold} for threshold in args.threshold]
+    scenarios += [{"weights": json.loads(weights)} for weights in args.weights]
+    if not scenarios:
+        parser.error("give at least one --threshold or --weights scenario")
+
+    started = time.time()
+    factors = load_factors(args.path, since=args.since, until=args.until, fmt=args.format)
+    loaded = time.time()
+    report = replay(factors, scenarios)
+    finished = time.time()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{report['tickets']} tickets | baseline escalation rate {report['baseline_rate']:.3f} "
+          f"(load {loaded - started:.2f}s, replay {finished - loaded:.2f}s)")
+    for result in report["scenarios"]:
+        print(f"\nScenario {json.dumps(result['scenario'])}: "
+              f"rate {result['escalation_rate']:.3f} ({result['delta']:+.3f})")
+        _print_breakdown("by topic", result["by_topic"])
+        _print_breakdown("by priority", result["by_priority"])
+
+
+if __name__ == "__main__":
+    main()
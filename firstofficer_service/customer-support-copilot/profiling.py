@@ -0,0 +1,239 @@
+# profiling.py
+"""
+On-demand sampling profiler for a live API process.
+
+A single background thread samples `sys._current_frames()` every
+PROFILE_INTERVAL_MS while at least one profiling session is active. Sessions
+either follow one request thread (`profile_request`) or every thread for a
+fixed window (`start_window`). When a session ends, its stacks are written to
+PROFILE_DIR as a collapsed-stack file (flamegraph.pl / speedscope format) and
+a self-contained SVG flamegraph.
+"""
+import html
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+# Share of requests profiled without being asked (0 disables)
+PROFILE_REQUEST_RATE = float(os.getenv("PROFILE_REQUEST_RATE", 0))
+
+
+class _Session:
+    def __init__(self, name: str, thread_id: Optional[int]):
+        self.name = name
+        # None means sample every thread
+        self.thread_id = thread_id
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = time.time()
+
+
+_lock = threading.Lock()
+_sessions: Dict[int, _Session] = {}
+_session_ids = iter(range(1, sys.maxsize))
+_sampler: Optional[threading.Thread] = None
+_labels: Dict[object, str] = {}
+
+
+def _frame_label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        filename = code.co_filename
+        # Keep paths short: project-relative, or the last two components for libraries
+        cwd = os.getcwd() + os.sep
+        if filename.startswith(cwd):
+            filename = filename[len(cwd):]
+        else:
+            filename = os.sep.join(filename.split(os.sep)[-2:])
+        label = _labels[code] = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+    return label
+
+
+def _collapse(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def _sample_loop():
+    global _sampler
+    interval = PROFILE_INTERVAL_MS / 1000.0
+    own_id = threading.get_ident()
+    while True:
+        with _lock:
+            sessions = list(_sessions.values())
+            if not sessions:
+                _sampler = None
+                return
+        frames = sys._current_frames()
+        if any(session.thread_id is None for session in sessions):
+            wanted = frames.keys() - {own_id}
+        else:
+            wanted = {session.thread_id for session in sessions} & frames.keys()
+        # Walk the stacks outside the lock; counting happens under it, so once _stop
+        # has popped a session no more samples land in the stacks it is writing out
+        collapsed = {thread_id: _collapse(frames[thread_id]) for thread_id in wanted}
+        del frames
+        with _lock:
+            for session in _sessions.values():
+                if session.thread_id is not None:
+                    stack = collapsed.get(session.thread_id)
+                    if stack is not None:
+                        session.stacks[stack] += 1
+                        session.samples += 1
+                else:
+                    for stack in collapsed.values():
+                        session.stacks[stack] += 1
+                    session.samples += 1
+        time.sleep(interval)
+
+
+def _start(session: _Session) -> int:
+    global _sampler
+    with _lock:
+        session_id = next(_session_ids)
+        _sessions[session_id] = session
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_loop, daemon=True, name="sampling-profiler")
+            _sampler.start()
+    return session_id
+
+
+def _stop(session_id: int) -> Optional[Dict]:
+    with _lock:
+        session = _sessions.pop(session_id, None)
+    if session is None:
+        return None
+    return write_profile(session)
+
+
+def write_profile(session: _Session) -> Dict:
+    """Write collapsed stacks and an SVG flamegraph for a finished session."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in session.name)
+    base = os.path.join(PROFILE_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{safe_name}-{random.randint(0, 0xffff):04x}")
+
+    collapsed_path = base + ".collapsed"
+    with open(collapsed_path, "w", encoding="utf-8") as f:
+        for stack, count in session.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+    svg_path = base + ".svg"
+    with open(svg_path, "w", encoding="utf-8") as f:
+        f.write(render_flamegraph(session.stacks, title=session.name))
+
+    return {
+        "name": session.name,
+        "samples": session.samples,
+        "seconds": round(time.time() - session.started, 3),
+        "collapsed": collapsed_path,
+        "flamegraph": svg_path,
+    }
+
+
+@contextmanager
+def profile_request(name: str, active: bool = True):
+    """Profile the calling thread for the duration of the block. Yields a result dict filled on exit."""
+    result: Dict = {}
+    if not active:
+        yield None
+        return
+    session_id = _start(_Session(name, threading.get_ident()))
+    try:
+        yield result
+    finally:
+        written = _stop(session_id)
+        if written:
+            result.update(written)
+            print(f"🔥 Profiled {name}: {written['samples']} samples -> {written['flamegraph']}")
+
+
+def should_sample_request() -> bool:
+    return PROFILE_REQUEST_RATE > 0 and random.random() < PROFILE_REQUEST_RATE
+
+
+def start_window(seconds: float, name: str = "window") -> Dict:
+    """Profile every thread for `seconds`, then write the output in the background."""
+    session_id = _start(_Session(name, None))
+
+    def _finish():
+        written = _stop(session_id)
+        if written:
+            print(f"🔥 Profiled {name}: {written['samples']} samples -> {written['flamegraph']}")
+
+    timer = threading.Timer(seconds, _finish)
+    timer.daemon = True
+    timer.start()
+    return {"session": session_id, "name": name, "seconds": seconds, "output_dir": PROFILE_DIR}
+
+
+def active_sessions() -> list:
+    with _lock:
+        return [
+            {"session": session_id, "name": s.name, "samples": s.samples,
+             "running_seconds": round(time.time() - s.started, 3)}
+            for session_id, s in _sessions.items()
+        ]
+
+
+# --- Flamegraph rendering ---
+def render_flamegraph(stacks: Counter, title: str = "", width: int = 1200, row_height: int = 16) -> str:
+    """Render collapsed stacks as a standalone SVG flamegraph (root at the bottom)."""
+    root: Dict = {"count": 0, "children": {}}
+    for stack, count in stacks.items():
+        node = root
+        node["count"] += count
+        for label in stack.split(";"):
+            node = node["children"].setdefault(label, {"count": 0, "children": {}})
+            node["count"] += count
+
+    total = root["count"] or 1
+    rects = []
+    max_depth = 0
+
+    def _layout(node, x: float, depth: int):
+        nonlocal max_depth
+        for label, child in sorted(node["children"].items()):
+            child_width = child["count"] / total * width
+            if child_width >= 0.5:
+                max_depth = max(max_depth, depth)
+                rects.append((label, child["count"], x, depth, child_width))
+                _layout(child, x, depth + 1)
+            x += child_width
+
+    _layout(root, 0.0, 0)
+    header = 24
+    height = header + (max_depth + 1) * row_height + 4
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'font-family="monospace" font-size="11">',
+        f'<text x="4" y="16">{html.escape(title)} ({total} samples)</text>',
+    ]
+    for label, count, x, depth, rect_width in rects:
+        y = height - (depth + 1) * row_height
+        hue = zlib.crc32(label.split(" (")[0].encode("utf-8")) % 60
+        tooltip = html.escape(f"{label}: {count} samples ({count / total:.1%})")
+        parts.append(
+            f'<g><title>{tooltip}</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{rect_width:.1f}" height="{row_height - 1}" '
+            f'fill="hsl({hue},85%,60%)"/>'
+        )
+        max_chars = int(rect_width / 7)
+        if max_chars >= 3:
+            text = label if len(label) <= max_chars else label[:max_chars - 2] + ".."
+            parts.append(f'<text x="{x + 2:.1f}" y="{y + row_height - 4}">{html.escape(text)}</text>')
+        parts.append("</g>")
+    parts.append("</svg>")
+    return "\n".join(parts)
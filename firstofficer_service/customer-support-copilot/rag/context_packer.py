@@ -0,0 +1,153 @@
+# rag/context_packer.py
+import os
+import re
+from typing import Dict, List
+
+import numpy as np
+
+# Ingestion splits with chunk_overlap=200, so adjacent chunks share at most a
+# few hundred characters. Anything shorter than MIN_OVERLAP_CHARS is treated as
+# a coincidental match rather than a real overlap.
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 400
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def count_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)."""
+    if not text:
+        return 0
+    return max(1, len(text) // 4)
+
+
+def _merge_overlapping(left: str, right: str):
+    """Return left+right with their shared span collapsed, or None if they don't overlap."""
+    if right in left:
+        return left
+    max_size = min(len(left), len(right), MAX_OVERLAP_CHARS)
+    for size in range(max_size, MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return None
+
+
+def merge_chunks(docs) -> List[Dict]:
+    """
+    Merge retrieved chunks that come from the same source, removing the
+    overlapping span between adjacent chunks. Sources keep retrieval order.
+    """
+    by_source: Dict[str, list] = {}
+    for doc in docs:
+        source = doc.metadata.get("source", "Unknown Source")
+        by_source.setdefault(source, []).append(doc)
+
+    segments = []
+    for source, chunks in by_source.items():
+        # Indexes built with add_start_index=True let us order chunks exactly
+        if all("start_index" in chunk.metadata for chunk in chunks):
+            chunks = sorted(chunks, key=lambda chunk: chunk.metadata["start_index"])
+
+        texts: List[str] = []
+        for chunk in chunks:
+            text = chunk.page_content.strip()
+            position = len(texts)
+            # Without start_index chunks arrive in relevance order, so one chunk can
+            # bridge two segments built so far: keep merging until nothing overlaps
+            merging = True
+            while merging:
+                merging = False
+                for i, existing in enumerate(texts):
+                    merged = _merge_overlapping(existing, text) or _merge_overlapping(text, existing)
+                    if merged is not None:
+                        del texts[i]
+                        position = min(position, i)
+                        text = merged
+                        merging = True
+                        break
+            texts.insert(min(position, len(texts)), text)
+        segments.extend({"source": source, "text": text} for text in texts)
+    return segments
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text) if s and s.strip()]
+
+
+def _relevance_scores(query: str, sentences: List[str], embedding) -> np.ndarray:
+    """Cosine similarity between the query and each sentence."""
+    sentence_vecs = np.asarray(embedding.embed_documents(sentences), dtype=np.float32)
+    query_vec = np.asarray(embedding.embed_query(query), dtype=np.float32)
+    sentence_norms = np.linalg.norm(sentence_vecs, axis=1) * np.linalg.norm(query_vec)
+    sentence_norms[sentence_norms == 0] = 1.0
+    return sentence_vecs @ query_vec / sentence_norms
+
+
+def pack_context(query: str, docs, embedding=None, token_budget: int = None) -> Dict:
+    """
+    Build a compact context string from retrieved chunks.
+
+    1. Merge chunks from the same source and drop overlapping spans.
+    2. Drop repeated sentences.
+    3. If still over `token_budget`, drop the sentences least relevant to the
+       query (scored with `embedding`) until the context fits.
+
+    Returns the packed context, the sources that survived, and token counts
+    before and after packing.
+    """
+    if token_budget is None:
+        token_budget = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", 600))
+
+    tokens_before = sum(count_tokens(doc.page_content) for doc in docs)
+    segments = merge_chunks(docs)
+
+    # (segment index, sentence) pairs, de-duplicated across all segments
+    sentences = []
+    seen = set()
+    for idx, segment in enumerate(segments):
+        for sentence in split_sentences(segment["text"]):
+            key = sentence.lower()
+            if key in seen:
+                continue
+            seen.add(key)
+            sentences.append((idx, sentence))
+
+    sentence_tokens = [count_tokens(sentence) for _, sentence in sentences]
+    total = sum(sentence_tokens)
+    keep = [True] * len(sentences)
+
+    if total > token_budget and len(sentences) > 1:
+        if embedding is not None:
+            try:
+                scores = _relevance_scores(query, [s for _, s in sentences], embedding)
+                drop_order = list(np.argsort(scores))
+            except Exception as e:
+                print(f"[Warning] Sentence scoring failed, trimming from the end: {e}")
+                drop_order = list(range(len(sentences) - 1, -1, -1))
+        else:
+            drop_order = list(range(len(sentences) - 1, -1, -1))
+
+        # Always keep at least one sentence
+        for i in drop_order[:-1]:
+            if total <= token_budget:
+                break
+            keep[i] = False
+            total -= sentence_tokens[i]
+
+    parts: Dict[int, List[str]] = {}
+    for (idx, sentence), kept in zip(sentences, keep):
+        if kept:
+            parts.setdefault(idx, []).append(sentence)
+
+    context = "\n\n".join(" ".join(parts[idx]) for idx in sorted(parts))
+    sources = []
+    for idx in sorted(parts):
+        if segments[idx]["source"] not in sources:
+            sources.append(segments[idx]["source"])
+
+    return {
+        "context": context,
+        "sources": sources,
+        "tokens_before": tokens_before,
+        "tokens_after": count_tokens(context),
+    }
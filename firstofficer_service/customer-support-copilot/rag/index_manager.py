@@ -0,0 +1,222 @@
+# rag/index_manager.py
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+CURRENT_FILE = "CURRENT"
+LEGACY_VERSION = "legacy"
+
+
+class IndexVersion:
+    """A loaded index plus the number of queries currently using it."""
+
+    def __init__(self, version: str, path: str, index):
+        self.version = version
+        self.path = path
+        self.index = index
+        self.in_flight = 0
+        self.loaded_at = time.time()
+
+    def close(self):
+        # Drop our reference so the FAISS buffers can be garbage collected
+        self.index = None
+
+
+class IndexManager:
+    """
+    Owns the live vector index and swaps in new versions without a restart.
+
+    Versions live in `versions_path/<version>/`; `versions_path/CURRENT` names
+    the one to serve. If there is no versions directory, `legacy_path` is
+    served as version "legacy".
+
+    Queries use `acquire()`, which pins the version they started on. `reload()`
+    loads the new version off to the side, validates it with `validate`, then
+    swaps the live handle under a lock. The previous version is freed once its
+    last in-flight query finishes. Callbacks registered with `on_swap()` run
+    after every swap so dependent caches can be invalidated.
+    """
+
+    def __init__(self, versions_path: str, legacy_path: str,
+                 loader: Callable[[str], object], validate: Callable[[object], None] = None):
+        self.versions_path = versions_path
+        self.legacy_path = legacy_path
+        self.loader = loader
+        self.validate = validate
+
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._current: Optional[IndexVersion] = None
+        self._retired: List[IndexVersion] = []
+        self._swap_callbacks: List[Callable[[IndexVersion], None]] = []
+        self._watcher: Optional[threading.Thread] = None
+        self.last_error: Optional[str] = None
+        # Last version that failed to load; the watcher leaves it alone until CURRENT moves on
+        self.failed_version: Optional[str] = None
+
+    # --- Version discovery ---
+    def published_version(self) -> str:
+        """Version named by the CURRENT pointer, or "legacy" if there is none."""
+        pointer = os.path.join(self.versions_path, CURRENT_FILE)
+        if os.path.exists(pointer):
+            with open(pointer, "r", encoding="utf-8") as f:
+                version = f.read().strip()
+            if version:
+                return version
+        return LEGACY_VERSION
+
+    def is_known_version(self, version: str) -> bool:
+        """True for "legacy" or a plain directory name that exists under versions_path."""
+        if version == LEGACY_VERSION:
+            return True
+        if not isinstance(version, str) or not version or version in (".", ".."):
+            return False
+        if os.sep in version or (os.altsep and os.altsep in version):
+            return False
+        return os.path.isdir(os.path.join(self.versions_path, version))
+
+    def version_path(self, version: str) -> str:
+        # Loading unpickles the index, so never resolve a path outside versions_path
+        if not self.is_known_version(version):
+            raise ValueError(f"Unknown index version: {version!r}")
+        if version == LEGACY_VERSION:
+            return self.legacy_path
+        return os.path.join(self.versions_path, version)
+
+    # --- Serving ---
+    @property
+    def current(self) -> Optional[IndexVersion]:
+        return self._current
+
+    @contextmanager
+    def acquire(self):
+        """Pin the live version for the duration of a query. Yields None if nothing is loaded."""
+        with self._lock:
+            handle = self._current
+            if handle is not None:
+                handle.in_flight += 1
+        try:
+            yield handle
+        finally:
+            if handle is not None:
+                with self._lock:
+                    handle.in_flight -= 1
+                    self._free_drained()
+
+    def _free_drained(self):
+        # Caller holds self._lock
+        for handle in [h for h in self._retired if h.in_flight == 0]:
+            self._retired.remove(handle)
+            handle.close()
+            print(f"🗑️ Freed index version {handle.version}")
+
+    def on_swap(self, callback: Callable[[IndexVersion], None]):
+        self._swap_callbacks.append(callback)
+
+    # --- Loading ---
+    def load(self, version: str = None) -> IndexVersion:
+        """Load and validate a version without serving it."""
+        version = version or self.published_version()
+        path = self.version_path(version)
+        index = self.loader(path)
+        if self.validate is not None:
+            self.validate(index)
+        return IndexVersion(version, path, index)
+
+    def reload(self, version: str = None, force: bool = False) -> Dict:
+        """
+        Load `version` (default: the published one) and swap it in. Returns a
+        status dict; the live version is left untouched on failure.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return {"status": "busy", "version": self.current_version()}
+        try:
+            version = version or self.published_version()
+            if not force and self._current is not None and self._current.version == version:
+                return {"status": "unchanged", "version": version}
+
+            started = time.time()
+            try:
+                handle = self.load(version)
+            except Exception as e:
+                self.last_error = f"{version}: {e}"
+                self.failed_version = version
+                print(f"⚠️ Failed to load index version {version}: {e}")
+                return {"status": "failed", "version": self.current_version(), "error": str(e)}
+
+            with self._lock:
+                old = self._current
+                self._current = handle
+                if old is not None:
+                    self._retired.append(old)
+                    self._free_drained()
+            self.last_error = None
+            self.failed_version = None
+
+            for callback in self._swap_callbacks:
+                try:
+                    callback(handle)
+                except Exception as e:
+                    print(f"[Warning] Index swap callback failed: {e}")
+
+            elapsed = time.time() - started
+            print(f"✅ Serving index version {version} (loaded in {elapsed:.1f}s)")
+            return {"status": "swapped", "version": version, "load_seconds": round(elapsed, 3)}
+        finally:
+            self._reload_lock.release()
+
+    def reload_in_background(self, version: str = None, force: bool = False) -> threading.Thread:
+        thread = threading.Thread(target=self.reload, args=(version, force), daemon=True)
+        thread.start()
+        return thread
+
+    def start_watcher(self, interval: float):
+        """
+        Poll the CURRENT pointer every `interval` seconds and reload when it changes.
+        A version that failed to load is not retried until CURRENT names another
+        one; an explicit reload() still retries it.
+        """
+        if self._watcher is not None or interval <= 0:
+            return
+
+        def _watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    published = self.published_version()
+                    if published not in (self.current_version(), self.failed_version):
+                        self.reload(published)
+                except Exception as e:
+                    print(f"[Warning] Index watcher error: {e}")
+
+        self._watcher = threading.Thread(target=_watch, daemon=True, name="index-watcher")
+        self._watcher.start()
+
+    # --- Introspection ---
+    def current_version(self) -> Optional[str]:
+        handle = self._current
+        return handle.version if handle is not None else None
+
+    def status(self) -> Dict:
+        with self._lock:
+            current = self._current
+            return {
+                "version": current.version if current else None,
+                "published_version": self.published_version(),
+                "loaded_at": current.loaded_at if current else None,
+                "in_flight": current.in_flight if current else 0,
+                "draining": [{"version": h.version, "in_flight": h.in_flight} for h in self._retired],
+                "last_error": self.last_error,
+                "failed_version": self.failed_version,
+            }
+
+
+def publish_version(versions_path: str, version: str):
+    """Atomically point CURRENT at `version`."""
+    os.makedirs(versions_path, exist_ok=True)
+    tmp_path = os.path.join(versions_path, f".{CURRENT_FILE}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(versions_path, CURRENT_FILE))
@@ -1,55 +1,147 @@
 from langchain_community.vectorstores import FAISS
 from langchain_community.embeddings import HuggingFaceEmbeddings
 import os
+import json
 from dotenv import load_dotenv
+import tracing
+from rag.context_packer import pack_context
+from rag.shard_router import ShardRouter
+from rag.index_manager import IndexManager
 
 # --- Load environment ---
 load_dotenv()
 
 # --- Vector store config ---
-VECTOR_STORE_PATH = "rag/rag/vector_store/faiss_index"
+VECTOR_STORE_ROOT = "rag/rag/vector_store"
+VECTOR_STORE_PATH = os.path.join(VECTOR_STORE_ROOT, "faiss_index")
+VERSIONS_PATH = os.path.join(VECTOR_STORE_ROOT, "versions")
+MANIFEST_FILE = "manifest.json"
+SMOKE_QUERY = os.getenv("RAG_INDEX_SMOKE_QUERY", "How do I set up SSO?")
 
 # Embeddings model
 embedding = HuggingFaceEmbeddings(
     model_name="sentence-transformers/all-MiniLM-L6-v2",
 )
 
-# --- Load FAISS index ONCE at startup ---
-try:
-    db = FAISS.load_local(
-        VECTOR_STORE_PATH,
-        embedding,
-        allow_dangerous_deserialization=True
-    )
-except Exception as e:
+
+class LoadedIndex:
+    """Everything retrieval needs from one index version."""
+
+    def __init__(self, db=None, shards=None, router=None):
+        self.db = db
+        self.shards = shards or {}
+        self.router = router
+
+
+def load_shards(shards_path):
+    """Load every shard listed in the manifest. Returns ({category: db}, router) or ({}, None)."""
+    manifest_path = os.path.join(shards_path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {}, None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    loaded = {
+        shard["category"]: FAISS.load_local(
+            os.path.join(shards_path, shard["path"]),
+            embedding,
+            allow_dangerous_deserialization=True
+        )
+        for shard in manifest["shards"]
+    }
+    return loaded, ShardRouter(manifest)
+
+
+def load_index(path):
+    """
+    Load the index stored in a version directory: a monolithic `faiss_index`,
+    a `shards` directory with a manifest, or both (shards take precedence).
+    """
     db = None
-    print(f"⚠️ Failed to load FAISS index from {VECTOR_STORE_PATH}: {e}")
+    faiss_path = os.path.join(path, "faiss_index")
+    if os.path.exists(faiss_path):
+        db = FAISS.load_local(faiss_path, embedding, allow_dangerous_deserialization=True)
+    shards, router = load_shards(os.path.join(path, "shards"))
+    if db is None and not shards:
+        raise FileNotFoundError(f"No FAISS index or shards found in {path}")
+    return LoadedIndex(db, shards, router)
 
-# --- Core Retrieval Function ---
-def retrieve_and_answer(query, k=3):
-    if db is None:
-        return "⚠️ Vector database not available. Please check FAISS index path."
 
-    # Retrieve top-k relevant docs
-    results = db.similarity_search(query, k=k)
+def search(query, k=3, topic=None, index=None):
+    """
+    Return the top-k documents for `query`. With shards loaded, only the
+    shards picked by the router are searched and their hits are merged by
+    distance; otherwise the monolithic index is used.
+    """
+    if index is None:
+        with index_manager.acquire() as handle:
+            if handle is None:
+                return []
+            return search(query, k=k, topic=topic, index=handle.index)
+
+    with tracing.span("retrieval.embed_query"):
+        query_vector = embedding.embed_query(query)
+
+    if not index.shards:
+        with tracing.span("retrieval.faiss"):
+            return index.db.similarity_search_by_vector(query_vector, k=k)
+
+    route = index.router.route(topic=topic, query_vector=query_vector)
+    print(f"🧭 Searching shards {route['categories']} ({route['reason']})")
+
+    hits = []
+    with tracing.span("retrieval.faiss"):
+        for category in route["categories"]:
+            hits.extend(index.shards[category].similarity_search_with_score_by_vector(query_vector, k=k))
+    # FAISS scores are L2 distances: lower is closer
+    hits.sort(key=lambda hit: hit[1])
+    return [doc for doc, _ in hits[:k]]
 
+
+def smoke_test(index):
+    """Reject an index version that can't answer a basic query."""
+    if not search(SMOKE_QUERY, k=1, index=index):
+        raise ValueError(f"Smoke query returned no results: {SMOKE_QUERY!r}")
+
+
+# --- Load FAISS index ONCE at startup; new versions are hot-swapped ---
+index_manager = IndexManager(VERSIONS_PATH, VECTOR_STORE_ROOT, load_index, smoke_test)
+index_manager.reload()
+
+
+# --- Core Retrieval Function ---
+def retrieve_context(query, k=3, token_budget=None, topic=None, index=None):
+    """
+    Retrieve top-k chunks and pack them into a de-overlapped context that
+    fits `token_budget`. Returns None when nothing was retrieved.
+    """
+    results = search(query, k=k, topic=topic, index=index)
     if not results:
+        return None
+
+    with tracing.span("retrieval.pack"):
+        packed = pack_context(query, results, embedding, token_budget=token_budget)
+    print(f"📦 Context packed: {packed['tokens_before']} -> {packed['tokens_after']} tokens")
+    return packed
+
+
+def retrieve_and_answer(query, k=3, topic=None):
+    # Pin one index version for the whole query so a concurrent swap can't free it
+    with index_manager.acquire() as handle:
+        if handle is None:
+            return "⚠️ Vector database not available. Please check FAISS index path."
+
+        # Retrieve top-k relevant docs
+        packed = retrieve_context(query, k=k, topic=topic, index=handle.index)
+
+    if packed is None:
         return (
             "No relevant information found in the documentation. "
             "This ticket should be routed to the support team."
         )
 
-    # Build response with sources
-    context_parts = []
-    sources = []
-    for doc in results:
-        source = doc.metadata.get("source", "Unknown Source")
-        context_parts.append(f"{doc.page_content}")
-        sources.append(source)
-
     answer = (
-        f"Answer: {' '.join(context_parts)}\n"
-        f"Sources: {', '.join(set(sources))}"
+        f"Answer: {packed['context']}\n"
+        f"Sources: {', '.join(packed['sources'])}"
     )
     return answer
 
@@ -0,0 +1,75 @@
+# rag/shard_router.py
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Classifier topics (see agent/classifier_agent.py) -> documentation categories
+# under rag/data that usually answer them.
+TOPIC_TO_CATEGORIES = {
+    "Connector": ["Integrate", "secure agent"],
+    "SSO": ["Integrate", "atlandoc-quickstart guide"],
+    "API/SDK": ["developer , introductory walkthru ,client sdks", "atlandoc-quickstart guide"],
+    "Lineage": ["find and understand data", "govern"],
+    "Glossary": ["find and understand data", "govern"],
+    "Sensitive data": ["govern", "secure agent"],
+    "Best practices": ["playbook", "atlandoc-quickstart guide"],
+    "Product": ["atlandoc-quickstart guide", "help and support"],
+    "How-to": ["atlandoc-quickstart guide", "find and understand data"],
+}
+
+
+class ShardRouter:
+    """
+    Picks the FAISS shards a query should be searched against.
+
+    Routing uses the classifier topic when it maps to known categories and the
+    cosine similarity between the query embedding and each shard centroid.
+    When neither signal is confident, every shard is searched.
+    """
+
+    def __init__(self, manifest: Dict, min_similarity: float = None, margin: float = None):
+        if min_similarity is None:
+            min_similarity = float(os.getenv("RAG_SHARD_MIN_SIMILARITY", 0.3))
+        if margin is None:
+            margin = float(os.getenv("RAG_SHARD_MARGIN", 0.05))
+        self.min_similarity = min_similarity
+        self.margin = margin
+
+        self.categories: List[str] = [shard["category"] for shard in manifest["shards"]]
+        centroids = np.asarray([shard["centroid"] for shard in manifest["shards"]], dtype=np.float32)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.centroids = centroids / norms
+
+    def _route_by_embedding(self, query_vector) -> List[str]:
+        """Shards whose centroid is within `margin` of the best match, or [] if unsure."""
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        similarities = self.centroids @ (query / norm)
+        best = float(similarities.max())
+        if best < self.min_similarity:
+            return []
+        return [
+            category
+            for category, similarity in zip(self.categories, similarities)
+            if similarity >= best - self.margin
+        ]
+
+    def route(self, topic: Optional[str] = None, query_vector=None) -> Dict:
+        """
+        Return {"categories": [...], "reason": str}. `categories` is always a
+        non-empty subset of the manifest categories.
+        """
+        by_topic = [c for c in TOPIC_TO_CATEGORIES.get(topic, []) if c in self.categories]
+        by_embedding = self._route_by_embedding(query_vector) if query_vector is not None else []
+
+        if by_topic:
+            # Keep the best embedding matches too in case the topic was misclassified
+            selected = by_topic + [c for c in by_embedding if c not in by_topic]
+            return {"categories": selected, "reason": f"topic:{topic}"}
+        if by_embedding:
+            return {"categories": by_embedding, "reason": "embedding"}
+        return {"categories": list(self.categories), "reason": "fallback:all"}
@@ -1,26 +1,44 @@
 import os
+import re
+import json
+import time
+import numpy as np
 from langchain.document_loaders import TextLoader, PyPDFLoader, UnstructuredFileLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
 from langchain_community.embeddings import HuggingFaceEmbeddings
+# Run from the rag/ directory, like the rest of this script
+from index_manager import IndexManager, publish_version
 
 # Directory containing documents
 DATA_DIR = "data/secure-agent"
-VECTOR_STORE_PATH = "rag/vector_store/faiss_index"
+VECTOR_STORE_ROOT = "rag/vector_store"
+
+# Every build writes a new directory under VERSIONS_PATH and then points
+# versions/CURRENT at it, so running API workers can hot-swap to it.
+VERSIONS_PATH = os.path.join(VECTOR_STORE_ROOT, "versions")
+
+# Sharded layout: one FAISS index per top-level category in DATA_ROOT
+DATA_ROOT = "data"
+MANIFEST_FILE = "manifest.json"
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 
 # Embedding model
 embedding = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2",
+    model_name=EMBEDDING_MODEL_NAME,
+)
+
+text_splitter = RecursiveCharacterTextSplitter(
+    chunk_size=1000, chunk_overlap=200, add_start_index=True
 )
 
-def build_vector_store():
-    if not os.path.exists(DATA_DIR):
-        raise FileNotFoundError(f"Data directory '{DATA_DIR}' does not exist.")
 
+def load_documents(data_dir):
+    """Load every file in `data_dir` with source metadata attached."""
     documents = []
 
-    for filename in os.listdir(DATA_DIR):
-        file_path = os.path.join(DATA_DIR, filename)
+    for filename in os.listdir(data_dir):
+        file_path = os.path.join(data_dir, filename)
 
         if filename.lower().endswith(".pdf"):
             loader = PyPDFLoader(file_path)
@@ -38,30 +56,127 @@ def build_vector_store():
                 "source": f"local://{filename}"
             })
         documents.extend(loaded_docs)
+    return documents
+
+
+def published_path():
+    """Directory of the index version currently being served."""
+    versions = IndexManager(VERSIONS_PATH, VECTOR_STORE_ROOT, loader=None)
+    return versions.version_path(versions.published_version())
+
+
+def new_version():
+    """Create an empty version directory. Returns (version, path)."""
+    base = time.strftime("%Y%m%d-%H%M%S")
+    version, suffix = base, 1
+    while os.path.exists(os.path.join(VERSIONS_PATH, version)):
+        suffix += 1
+        version = f"{base}-{suffix}"
+    path = os.path.join(VERSIONS_PATH, version)
+    os.makedirs(path)
+    return version, path
+
+
+def build_vector_store(publish=True):
+    if not os.path.exists(DATA_DIR):
+        raise FileNotFoundError(f"Data directory '{DATA_DIR}' does not exist.")
+
+    documents = load_documents(DATA_DIR)
 
     if not documents:
         raise ValueError("No documents found to build the vector store.")
 
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000, chunk_overlap=200
-    )
     docs = text_splitter.split_documents(documents)
 
     print(f"Split into {len(docs)} chunks. Creating embeddings...")
 
-    # If FAISS index already exists, load & append
-    if os.path.exists(VECTOR_STORE_PATH):
-        print(f"Loading existing vector store from {VECTOR_STORE_PATH}...")
-        db = FAISS.load_local(VECTOR_STORE_PATH, embedding, allow_dangerous_deserialization=True)
+    # If the served version has a FAISS index, load & append
+    existing_path = os.path.join(published_path(), "faiss_index")
+    if os.path.exists(existing_path):
+        print(f"Loading existing vector store from {existing_path}...")
+        db = FAISS.load_local(existing_path, embedding, allow_dangerous_deserialization=True)
         db.add_documents(docs)
     else:
         print("Creating new vector store...")
         db = FAISS.from_documents(docs, embedding)
 
-    # Save updated DB
-    os.makedirs(os.path.dirname(VECTOR_STORE_PATH), exist_ok=True)
-    db.save_local(VECTOR_STORE_PATH)
-    print(f"✅ Vector store updated and saved to {VECTOR_STORE_PATH}.")
+    # Save updated DB as a new version
+    version, version_path = new_version()
+    db.save_local(os.path.join(version_path, "faiss_index"))
+    print(f"✅ Vector store saved as version {version} in {version_path}.")
+    if publish:
+        publish_version(VERSIONS_PATH, version)
+        print(f"📢 Published version {version}.")
+    return version
+
+
+def shard_slug(category: str) -> str:
+    """Filesystem-safe shard name for a category directory."""
+    return re.sub(r"[^a-z0-9]+", "-", category.lower()).strip("-")
+
+
+def build_sharded_vector_store(publish=True):
+    """
+    Build one FAISS shard per category directory under DATA_ROOT and write a
+    manifest describing them. Each manifest entry stores the shard centroid so
+    the retrieval router can match queries to shards without loading them.
+    """
+    if not os.path.exists(DATA_ROOT):
+        raise FileNotFoundError(f"Data directory '{DATA_ROOT}' does not exist.")
+
+    version, version_path = new_version()
+    shards_path = os.path.join(version_path, "shards")
+
+    shards = []
+    for category in sorted(os.listdir(DATA_ROOT)):
+        category_dir = os.path.join(DATA_ROOT, category)
+        if not os.path.isdir(category_dir):
+            continue
+
+        documents = load_documents(category_dir)
+        if not documents:
+            print(f"Skipping empty category '{category}'.")
+            continue
+        for doc in documents:
+            doc.metadata["category"] = category
+
+        docs = text_splitter.split_documents(documents)
+        print(f"[{category}] {len(documents)} documents -> {len(docs)} chunks. Creating embeddings...")
+
+        slug = shard_slug(category)
+        db = FAISS.from_documents(docs, embedding)
+        db.save_local(os.path.join(shards_path, slug))
+
+        vectors = db.index.reconstruct_n(0, db.index.ntotal)
+        vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        shards.append({
+            "category": category,
+            "slug": slug,
+            "path": slug,
+            "num_documents": len(documents),
+            "num_chunks": len(docs),
+            "centroid": vectors.mean(axis=0).tolist(),
+        })
+
+    if not shards:
+        raise ValueError("No documents found to build the vector store.")
+
+    manifest = {"embedding_model": EMBEDDING_MODEL_NAME, "shards": shards}
+    os.makedirs(shards_path, exist_ok=True)
+    with open(os.path.join(shards_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    print(f"✅ Built {len(shards)} shards as version {version} in {shards_path}.")
+    if publish:
+        publish_version(VERSIONS_PATH, version)
+        print(f"📢 Published version {version}.")
+    return version
+
 
 if __name__ == "__main__":
-    build_vector_store()
+    import sys
+
+    publish = "--no-publish" not in sys.argv
+    if "--sharded" in sys.argv:
+        build_sharded_vector_store(publish=publish)
+    else:
+        build_vector_store(publish=publish)
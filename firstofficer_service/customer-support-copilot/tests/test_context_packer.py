@@ -0,0 +1,27 @@
+"""merge_chunks must rebuild one segment from overlapping chunks in any retrieval order."""
+import itertools
+import random
+from types import SimpleNamespace
+
+from rag.context_packer import merge_chunks
+
+
+def _chunk(text: str, source: str = "guide.md"):
+    # Legacy index chunks: no start_index in the metadata
+    return SimpleNamespace(page_content=text, metadata={"source": source})
+
+
+def test_merge_chunks_joins_chunks_in_any_order():
+    rng = random.Random(0)
+    text = " ".join(f"word{rng.randint(0, 9999)}" for _ in range(400))[:2600]
+    # 1000-character chunks with 200 characters of overlap, as at ingestion
+    chunks = [_chunk(text[0:1000]), _chunk(text[800:1800]), _chunk(text[1600:2600])]
+
+    for order in itertools.permutations(chunks):
+        segments = merge_chunks(list(order))
+        assert [segment["text"] for segment in segments] == [text]
+
+
+def test_merge_chunks_keeps_unrelated_chunks_apart():
+    segments = merge_chunks([_chunk("First unrelated passage."), _chunk("Second unrelated passage.")])
+    assert len(segments) == 2
@@ -0,0 +1,78 @@
+"""score_batch must make the same decisions as EscalationDecisionEngine.score."""
+import random
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from agent.escalation_batch import (
+    COMPLEXITY_KEYWORDS,
+    CRITICAL_TOPICS,
+    PRIORITY_URGENCY,
+    SENTIMENT_URGENCY,
+    EscalationDecisionEngine,
+    detect_format,
+    extract_features,
+    load_factors,
+    score_batch,
+    to_columns,
+)
+
+TOPICS = list(CRITICAL_TOPICS) + ["How-to", "Product", "Connector", "SSO", "Unknown"]
+SENTIMENTS = list(SENTIMENT_URGENCY) + ["Neutral", "Curious", "Happy"]
+PRIORITIES = list(PRIORITY_URGENCY) + ["P2"]
+WORDS = ["data", "lineage", "asset", "error", "please", "why", "table"] + COMPLEXITY_KEYWORDS
+
+
+def _random_tickets(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    tickets = []
+    for _ in range(n):
+        # Lengths either side of LONG_QUERY_WORDS
+        query = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 80)))
+        if rng.random() < 0.5:
+            query += "?"
+        classification = {
+            "topic": rng.choice(TOPICS),
+            "sentiment": rng.choice(SENTIMENTS),
+            "priority": rng.choice(PRIORITIES),
+        }
+        tickets.append((query, classification))
+    return tickets
+
+
+def test_score_batch_matches_engine():
+    tickets = _random_tickets(2000)
+    engine = EscalationDecisionEngine(escalation_threshold=0.6)
+
+    expected = [engine.score(query, classification) for query, classification in tickets]
+    rows = [dict(extract_features(query, classification), response_quality=0.0)
+            for query, classification in tickets]
+    batch = score_batch(to_columns(pa.Table.from_pylist(rows)), threshold=0.6)
+
+    np.testing.assert_allclose(batch["escalation_score"], [d["escalation_score"] for d in expected])
+    assert batch["should_escalate"].tolist() == [d["should_escalate"] for d in expected]
+    for name in ("complexity", "sentiment_urgency", "topic_criticality"):
+        np.testing.assert_allclose(batch[name], [d["factors"][name] for d in expected])
+    # Both outcomes are exercised
+    assert 0 < batch["should_escalate"].sum() < len(tickets)
+
+
+def test_load_factors_reads_parquet_and_arrow_output(tmp_path):
+    rows = [dict(extract_features(query, classification), response_quality=0.0, error=None)
+            for query, classification in _random_tickets(50)]
+    table = pa.Table.from_pylist(rows)
+    (tmp_path / "parquet").mkdir()
+    (tmp_path / "arrow").mkdir()
+    # Same layout as bulk_process.py --format parquet / arrow, including its checkpoint file
+    pq.write_table(table, tmp_path / "parquet" / "part-000000.parquet")
+    feather.write_feather(table, tmp_path / "arrow" / "part-000000.arrow")
+    (tmp_path / "arrow" / "_checkpoint.json").write_text("{}")
+
+    assert detect_format(str(tmp_path / "parquet")) == "parquet"
+    assert detect_format(str(tmp_path / "arrow")) == "arrow"
+    expected = score_batch(to_columns(table))
+    for fmt in ("parquet", "arrow"):
+        loaded = score_batch(load_factors(str(tmp_path / fmt)))
+        np.testing.assert_allclose(loaded["escalation_score"], expected["escalation_score"])
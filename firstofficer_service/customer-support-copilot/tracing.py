@@ -0,0 +1,214 @@
+# tracing.py
+"""
+Lightweight per-stage latency tracing.
+
+    with tracing.span("rag.retrieval"):
+        ...
+    with tracing.span("mquery.answer_llm") as s:
+        response = llm.invoke(prompt)
+        s.record_llm(response)
+
+Spans roll up into in-process histograms (rendered as Prometheus text by
+`render_prometheus`) and, inside `request_trace()`, into a per-request list of
+stage timings. When tracing is off and no request trace is active, `span()`
+returns a shared no-op object, so the cost is a flag check and a ContextVar
+lookup.
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_enabled = os.getenv("TRACING_ENABLED", "false").lower() in ("1", "true", "yes")
+_lock = threading.Lock()
+_histograms: Dict[str, "_Histogram"] = {}
+_llm_tokens: Dict[tuple, int] = {}
+_llm_calls: Dict[str, int] = {}
+# Always-on counters: metric name -> {sorted label items: value}
+_counters: Dict[str, Dict[tuple, float]] = {}
+_current_trace: ContextVar[Optional[List[Dict]]] = ContextVar("current_trace", default=None)
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def record_llm(self, response):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("name", "start", "tokens")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.tokens = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        # Histograms only reflect traffic while tracing is on, not one-off request traces
+        if _enabled:
+            with _lock:
+                histogram = _histograms.get(self.name)
+                if histogram is None:
+                    histogram = _histograms[self.name] = _Histogram()
+                histogram.observe(seconds)
+
+        trace = _current_trace.get()
+        if trace is not None:
+            entry = {"stage": self.name, "ms": round(seconds * 1000, 2)}
+            if self.tokens:
+                entry.update(self.tokens)
+            if exc_type is not None:
+                entry["error"] = exc_type.__name__
+            trace.append(entry)
+        return False
+
+    def record_llm(self, response):
+        """Count the LLM call and its input/output tokens from langchain usage metadata."""
+        usage = getattr(response, "usage_metadata", None) or {}
+        self.tokens = {
+            "input_tokens": int(usage.get("input_tokens", 0) or 0),
+            "output_tokens": int(usage.get("output_tokens", 0) or 0),
+        }
+        if not _enabled:
+            return
+        with _lock:
+            _llm_calls[self.name] = _llm_calls.get(self.name, 0) + 1
+            for kind in ("input", "output"):
+                key = (self.name, kind)
+                _llm_tokens[key] = _llm_tokens.get(key, 0) + self.tokens[f"{kind}_tokens"]
+
+
+def span(name: str):
+    if _enabled or _current_trace.get() is not None:
+        return Span(name)
+    return _NOOP
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(value: bool):
+    global _enabled
+    _enabled = value
+
+
+@contextmanager
+def request_trace(active: bool = True):
+    """Collect the spans of the current request. Yields the list, or None if inactive."""
+    if not active:
+        yield None
+        return
+    trace: List[Dict] = []
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def incr(metric: str, amount: float = 1, **labels):
+    """
+    Add to a counter served on /api/metrics. Unlike spans these are recorded
+    even with tracing off, for cheap operational counts.
+    """
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        series = _counters.setdefault(metric, {})
+        series[key] = series.get(key, 0) + amount
+
+
+def counters() -> Dict[str, Dict[tuple, float]]:
+    with _lock:
+        return {metric: dict(series) for metric, series in _counters.items()}
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _llm_tokens.clear()
+        _llm_calls.clear()
+        _counters.clear()
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus() -> str:
+    """Prometheus text exposition of all stage histograms and LLM counters."""
+    with _lock:
+        histograms = {name: (list(h.counts), h.total, h.count) for name, h in _histograms.items()}
+        tokens = dict(_llm_tokens)
+        calls = dict(_llm_calls)
+        counters = {metric: dict(series) for metric, series in _counters.items()}
+
+    lines = [
+        "# HELP copilot_stage_duration_seconds Time spent in each pipeline stage.",
+        "# TYPE copilot_stage_duration_seconds histogram",
+    ]
+    for name in sorted(histograms):
+        counts, total, count = histograms[name]
+        stage = _label(name)
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS, counts):
+            cumulative += bucket_count
+            lines.append(f'copilot_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'copilot_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+        lines.append(f'copilot_stage_duration_seconds_sum{{stage="{stage}"}} {total:.6f}')
+        lines.append(f'copilot_stage_duration_seconds_count{{stage="{stage}"}} {count}')
+
+    lines += [
+        "# HELP copilot_llm_calls_total LLM calls per stage.",
+        "# TYPE copilot_llm_calls_total counter",
+    ]
+    for name in sorted(calls):
+        lines.append(f'copilot_llm_calls_total{{stage="{_label(name)}"}} {calls[name]}')
+
+    lines += [
+        "# HELP copilot_llm_tokens_total LLM tokens per stage.",
+        "# TYPE copilot_llm_tokens_total counter",
+    ]
+    for (name, kind) in sorted(tokens):
+        lines.append(f'copilot_llm_tokens_total{{stage="{_label(name)}",kind="{kind}"}} {tokens[(name, kind)]}')
+
+    for metric in sorted(counters):
+        lines.append(f"# TYPE {metric} counter")
+        for key, value in sorted(counters[metric].items()):
+            labels = ",".join(f'{name}="{_label(str(label))}"' for name, label in key)
+            value = round(value, 6) if isinstance(value, float) else value
+            lines.append(f"{metric}{{{labels}}} {value}" if labels else f"{metric} {value}")
+
+    return "\n".join(lines) + "\n"